@@ -29,10 +29,10 @@ import re
 import json
 import subprocess
 from pathlib import Path
+from src import jsonio
+from src.config import load_env
 
-from dotenv import load_dotenv
-
-load_dotenv()
+load_env()
 
 # Fix Windows console encoding (cp1252 can't handle Unicode box chars)
 if sys.stdout.encoding != "utf-8":
@@ -214,6 +214,8 @@ def main(
         print(f"\n   ✅ Phase 1 complete → {manuscript_file}\n")
 
         # ── Phase 1.5: The Curriculum Planner ──
+        # Runs on the cleaned manuscript, so tags of discarded images never
+        # reach the syllabus prompt
         print("━" * 58)
         print("🎓  PHASE 1.5 — THE CURRICULUM PLANNER")
         print("━" * 58)
@@ -474,7 +476,7 @@ def main(
         total = saved.get("total_chunks", 0)
         style_config = saved.get("style_config", {})
 
-    from src.structurer import structurer_node
+    from src.structurer import structure_chunks
     from src.renderer_latex import render_page_latex
 
     # 1. Read the resolved manuscript (or expanded if resolved missing)
@@ -536,52 +538,49 @@ def main(
     _completed_count = [0]
     _checkpoint_lock = asyncio.Lock()
 
-    async def _async_process_chunk(sem, i, chunk):
-        async with sem:
-            try:
-                data = await structurer_node(chunk)
-                if isinstance(data, dict) and "error" in data:
-                    error_msg = data["error"]
-                    if "rate limit" not in error_msg.lower() and "429" not in error_msg:
-                        raise Exception(f"Structurer Error: {error_msg}")
-                    return i, None
-                
-                res_node = None
-                if isinstance(data, list):
-                    res_node = {"type": "chapter", "sections": data}
-                elif isinstance(data, dict) and "error" not in data:
-                    res_node = data
-                else:
-                    raise Exception(f"Unexpected structurer return type: {type(data)}")
-
-                # Update results and save periodic checkpoint
-                results_map[i] = res_node
-                _completed_count[0] += 1
-                
-                if _completed_count[0] % 50 == 0 or _completed_count[0] == len(remaining_chunks):
-                    async with _checkpoint_lock:
-                        print(f"   Processing section {start_section + _completed_count[0]}/{len(chunks)}...")
-                        ordered = [results_map[k] for k in sorted(results_map.keys())]
-                        full_structure["sections"] = existing_sections + ordered
-                        json_path.write_text(json.dumps(full_structure, indent=2), encoding="utf-8")
-                        print(f"   💾 Checkpoint saved ({start_section + _completed_count[0]}/{len(chunks)} sections processed)")
-                
-                return i, res_node
+    async def _on_structured(j, data):
+        i, chunk = remaining_chunks[j]
+        try:
+            if isinstance(data, dict) and "error" in data:
+                error_msg = data["error"]
+                if "rate limit" not in error_msg.lower() and "429" not in error_msg:
+                    raise Exception(f"Structurer Error: {error_msg}")
+                return
 
-            except Exception as e:
-                fallback_text = chunk[:2000] if len(chunk) > 2000 else chunk
-                res_node = {
-                    "type": "chapter",
-                    "sections": [{"type": "paragraph", "text": fallback_text}],
-                    "_failed": str(e)[:100],
-                }
-                results_map[i] = res_node
-                return i, res_node
+            res_node = None
+            if isinstance(data, list):
+                res_node = {"type": "chapter", "sections": data}
+            elif isinstance(data, dict) and "error" not in data:
+                res_node = data
+            else:
+                raise Exception(f"Unexpected structurer return type: {type(data)}")
+
+            # Update results and save periodic checkpoint
+            results_map[i] = res_node
+            _completed_count[0] += 1
+
+            if _completed_count[0] % 50 == 0 or _completed_count[0] == len(remaining_chunks):
+                async with _checkpoint_lock:
+                    print(f"   Processing section {start_section + _completed_count[0]}/{len(chunks)}...")
+                    ordered = [results_map[k] for k in sorted(results_map.keys())]
+                    full_structure["sections"] = existing_sections + ordered
+                    json_path.write_text(jsonio.dumps(full_structure), encoding="utf-8")
+                    print(f"   💾 Checkpoint saved ({start_section + _completed_count[0]}/{len(chunks)} sections processed)")
+
+        except Exception as e:
+            fallback_text = chunk[:2000] if len(chunk) > 2000 else chunk
+            results_map[i] = {
+                "type": "chapter",
+                "sections": [{"type": "paragraph", "text": fallback_text}],
+                "_failed": str(e)[:100],
+            }
 
     async def run_phase_4_structuring():
-        sem = asyncio.Semaphore(CONCURRENCY)
-        tasks = [_async_process_chunk(sem, i, chunk) for i, chunk in remaining_chunks]
-        await asyncio.gather(*tasks)
+        await structure_chunks(
+            [chunk for _, chunk in remaining_chunks],
+            concurrency=CONCURRENCY,
+            on_result=_on_structured,
+        )
 
     # Run the async structuring
     asyncio.run(run_phase_4_structuring())
@@ -677,7 +676,7 @@ def main(
         print(f"   ✅ Diagrams resolved: {_diagram_count[0]} generated, rest stripped.")
 
     # 4. Save JSON structure (json_path already declared above at checkpoint section)
-    json_path.write_text(json.dumps(full_structure, indent=2), encoding="utf-8")
+    json_path.write_text(jsonio.dumps(full_structure), encoding="utf-8")
     print(f"📄 JSON saved: {json_path}")
 
     # QA CHECK: Validation Agent
@@ -708,15 +707,16 @@ def main(
     print(f"   📊 Final chapter count: {len(chapters)}")
 
     # 5. Render Typst
-    from src.renderer_typst import render_page_typst, sanitize_typst_output
+    from src.renderer_typst import render_pages_typst, sanitize_typst_output
 
+    print(f"   Rendering {len(chapters)} chapters in parallel...")
     typst_parts = []
-    for chapter in chapters:
-        try:
-            print(f"   Rendering Chapter {chapters.index(chapter) + 1}/{len(chapters)}...")
-            typst_parts.append(render_page_typst(chapter))
-        except Exception as e:
-            print(f"   ⚠️ Typst render error: {e} — skipping chapter")
+    rendered_pages = render_pages_typst(chapters, cache_dir=OUTPUT_DIR / ".render_cache")
+    for i, (rendered, error) in enumerate(rendered_pages, 1):
+        if error is not None:
+            print(f"   ⚠️ Typst render error in chapter {i}: {error} — skipping chapter")
+            continue
+        typst_parts.append(rendered)
 
     # 6. Build Typst document
     typ_out = OUTPUT_DIR / "BookEducate.typ"
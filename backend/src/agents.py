@@ -12,23 +12,25 @@ Persona and subject are configured via environment variables:
 from __future__ import annotations
 
 import asyncio
-import json
 import os
+import socket
 from functools import lru_cache
 from pathlib import Path
 
 import litellm
-from dotenv import load_dotenv
-
+from src import jsonio
+from src.config import load_env
+from src.ratelimit import backoff_delay, get_bucket
 from src.state import BookState
 
-load_dotenv()
+load_env()
 
 # ──────────────────────────────────────────────
 # CONFIGURATION
 # ──────────────────────────────────────────────
 LLM_TIMEOUT = 1800  # 30 minutes — gives CPU-based Ollama time to finish
 DEFAULT_FALLBACK_MODEL = "gemini/gemini-2.0-flash"
+TIMEOUT_RETRY_SECONDS = 5  # Flat retry delay for transient timeouts
 
 
 def _get_model() -> str:
@@ -185,8 +187,8 @@ def _get_syllabus_context() -> str:
     syllabus_path = _base / "data" / "output" / "syllabus.json"
     if syllabus_path.exists():
         try:
-            syllabus_data = json.loads(syllabus_path.read_text(encoding="utf-8"))
-            parsed_syllabus = json.dumps(syllabus_data, indent=2)
+            syllabus_data = jsonio.loads(syllabus_path.read_bytes())
+            parsed_syllabus = jsonio.dumps(syllabus_data)
             syllabus_context = (
                 f"=== MASTER SYLLABUS ===\n{parsed_syllabus}\n======================="
             )
@@ -372,9 +374,6 @@ async def drafter_node(state: BookState) -> dict:
     Expands the chapter using synthetic authoring with first-principles
     derivation, mirror problems, and diagram tags.
     """
-    import json
-    from pathlib import Path
-
     # Safely extract state with defaults
     chunk = state.get("current_chunk", "")
     analysis = state.get("analysis", "")
@@ -402,13 +401,13 @@ async def drafter_node(state: BookState) -> dict:
     math_path = _base / "data" / "output" / "transcribed_math.json"
     if math_path.exists():
         try:
-            math_data = json.loads(math_path.read_text(encoding="utf-8"))
+            math_data = jsonio.loads(math_path.read_bytes())
             # Simple heuristic: Include ALL transcribed math for now,
             # or filter by page if we had page info in chunk.
             # Since we iterate sequentially, passing the whole dict is okay for 128k context,
             # but better to just pass it all as reference.
             if math_data:
-                math_formatted = json.dumps(math_data, indent=2)
+                math_formatted = jsonio.dumps(math_data)
                 math_context = f"\n\n=== TRANSCRIBED MATH (RESCUED FROM IMAGES) ===\n{math_formatted}\n"
         except Exception as e:
             print(f"⚠️ Failed to load math JSON: {e}")
@@ -639,6 +638,7 @@ async def critic_node(state: BookState) -> dict:
                     )
                     return {"feedback": "APPROVED"}
 
+                await get_bucket(model).acquire()
                 response = await litellm.acompletion(
                     model=model,
                     timeout=LLM_TIMEOUT,
@@ -664,19 +664,17 @@ async def critic_node(state: BookState) -> dict:
                     api_base=os.getenv("OLLAMA_API_BASE") if os.getenv("LLM_PROVIDER") == "ollama" else None,
                 )
                 break
-            except litellm.APIConnectionError:
-                print("[Critic] 📡 Internet disconnected. Sleeping 30s...")
-                await asyncio.sleep(30)
-            except Exception as other_err:
-                if (
-                    "11001" in str(other_err).lower()
-                    or "getaddrinfo" in str(other_err).lower()
-                    or "time" in str(other_err).lower()
-                ):
-                    print("[Critic] 📡 Internet disconnected/Timeout. Sleeping 30s...")
-                    await asyncio.sleep(30)
-                else:
-                    raise other_err
+            except litellm.RateLimitError:
+                delay = backoff_delay(attempt)
+                print(f"[Critic] ⏳ Rate limit hit. Sleeping {delay:.1f}s...")
+                await asyncio.sleep(delay)
+            except (litellm.Timeout, asyncio.TimeoutError):
+                print(f"[Critic] ⏱️ Timeout. Retrying in {TIMEOUT_RETRY_SECONDS}s...")
+                await asyncio.sleep(TIMEOUT_RETRY_SECONDS)
+            except (litellm.APIConnectionError, socket.gaierror):
+                delay = backoff_delay(attempt)
+                print(f"[Critic] 📡 Internet disconnected. Sleeping {delay:.1f}s...")
+                await asyncio.sleep(delay)
         else:
             return {"feedback": "APPROVED"}
 
@@ -706,7 +704,8 @@ async def critic_node(state: BookState) -> dict:
         print(f"[Critic] ⚠️ Failed to extract content: {e}. Approving by default.")
         return {"feedback": "APPROVED"}
 
-    is_approved = "APPROVED" in feedback.upper()
+    # The critic is prompted to lead with 'APPROVED', so only the prefix matters
+    is_approved = feedback[:8].upper() == "APPROVED"
     ratio = len(expanded) / max(len(original), 1)
 
     if is_approved:
@@ -1,7 +1,12 @@
-import json
+import os
 import re
 from pathlib import Path
 
+from src import jsonio
+
+_IMG_RE = re.compile(r"!\[.*?\]\((.*?)\)")
+_OUTPUT_PREFIX_RE = re.compile(r"^/?data/output/")
+
 
 def run_qa_check(structure_path: str, output_dir: str):
     """
@@ -18,8 +23,7 @@ def run_qa_check(structure_path: str, output_dir: str):
         return
 
     try:
-        with open(struct_file, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = jsonio.loads(struct_file.read_bytes())
     except Exception as e:
         print(f"❌ QA FAILED: Could not decode JSON. {e}")
         return
@@ -40,6 +44,13 @@ def run_qa_check(structure_path: str, output_dir: str):
     missing_images = []
     unresolved_list = []
 
+    # Scan the output tree once so image checks are set lookups, not stat() calls
+    existing_files = set()
+    for root, _dirs, files in os.walk(output_dir):
+        for name in files:
+            rel = os.path.relpath(os.path.join(root, name), output_dir)
+            existing_files.add(rel.replace(os.sep, "/"))
+
     def check_node(node):
         if not isinstance(node, dict):
             return
@@ -59,8 +70,8 @@ def run_qa_check(structure_path: str, output_dir: str):
                 unresolved_list.append(text[:50].replace("\n", " ") + "...")
 
             # Check for valid image paths: ![alt](path)
-            # Standard markdown image regex
-            img_matches = re.finditer(r"!\[.*?\]\((.*?)\)", text)
+            # Cheap substring gate before running the markdown image regex
+            img_matches = _IMG_RE.finditer(text) if "![" in text else ()
             for m in img_matches:
                 img_path = m.group(1).split(" ")[
                     0
@@ -69,10 +80,14 @@ def run_qa_check(structure_path: str, output_dir: str):
 
                 # Check root relative to base dir or output dir
                 # If path starts with /data/output, strip it
-                clean_path = re.sub(r"^/?data/output/", "", img_path)
-                full_path = Path(output_dir) / clean_path
+                clean_path = _OUTPUT_PREFIX_RE.sub("", img_path)
+                if os.path.isabs(clean_path):
+                    exists = Path(clean_path).exists()
+                else:
+                    rel = os.path.normpath(clean_path).replace("\\", "/")
+                    exists = rel in existing_files
 
-                if full_path.exists():
+                if exists:
                     metrics["images_valid"] += 1
                 else:
                     metrics["images_missing"] += 1
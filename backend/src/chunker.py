@@ -18,6 +18,10 @@ import os
 
 MAX_CHUNK_CHARS = int(os.getenv("MAX_CHUNK_CHARS", "800"))
 
+# Warm-run cache: (path, mtime_ns, size) → chunk list, FIFO-capped
+_CHUNK_CACHE: dict[tuple[str, int, int], list[str]] = {}
+_CHUNK_CACHE_MAX = 8
+
 
 def _split_by_chapter(text: str) -> list[str]:
     """Strategy A: Split on 'Chapter', 'Unit', 'Module', or 'Part' headings."""
@@ -45,14 +49,16 @@ def _split_by_length(text: str, max_chars: int = MAX_CHUNK_CHARS) -> list[str]:
     current: list[str] = []
     current_len = 0
 
+    # Invariant: current_len == len("\n\n".join(current))
     for para in paragraphs:
         para_len = len(para)
+        sep_cost = 2 if current else 0
 
         # New safe logic:
-        # 1. If current buffer + para fits, append it
-        if current_len + para_len <= max_chars:
+        # 1. If current buffer + separator + para fits, append it
+        if current_len + sep_cost + para_len <= max_chars:
             current.append(para)
-            current_len += para_len + 2
+            current_len += sep_cost + para_len
         else:
             # 2. If buffer is not empty, flush it first
             if current:
@@ -85,7 +91,7 @@ def _split_by_length(text: str, max_chars: int = MAX_CHUNK_CHARS) -> list[str]:
             else:
                 # Otherwise, it fits in a fresh chunk
                 current.append(para)
-                current_len = len(para) + 2
+                current_len = para_len
 
     if current:
         chunks.append("\n\n".join(current))
@@ -116,6 +122,13 @@ def chunk_manuscript(filepath: str | Path) -> list[str]:
     if not filepath.exists():
         raise FileNotFoundError(f"Manuscript not found: {filepath}")
 
+    stat = filepath.stat()
+    cache_key = (str(filepath.resolve()), stat.st_mtime_ns, stat.st_size)
+    cached = _CHUNK_CACHE.get(cache_key)
+    if cached is not None:
+        print(f"[Chunker] ♻️  Using cached split ({len(cached)} chunk(s))")
+        return list(cached)
+
     text = filepath.read_text(encoding="utf-8")
 
     # Strategy A: Chapter-based split
@@ -145,7 +158,11 @@ def chunk_manuscript(filepath: str | Path) -> list[str]:
         preview = ch[:80].replace("\n", " ")
         print(f'  Chunk {i + 1}: {len(ch):,} chars — "{preview}…"')
 
-    return final_chunks
+    if len(_CHUNK_CACHE) >= _CHUNK_CACHE_MAX:
+        del _CHUNK_CACHE[next(iter(_CHUNK_CACHE))]
+    _CHUNK_CACHE[cache_key] = final_chunks
+
+    return list(final_chunks)
 
 
 # ──────────────────────────────────────────────
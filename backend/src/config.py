@@ -9,6 +9,8 @@ from __future__ import annotations
 import os
 from pathlib import Path
 
+from dotenv import load_dotenv
+
 # ──────────────────────────────────────────────
 # PATHS
 # ──────────────────────────────────────────────
@@ -40,6 +42,17 @@ BOOK_PERSONA = os.getenv(
 )
 
 
+def load_env() -> None:
+    """
+    Load ``.env`` once per process tree. The marker variable is inherited by
+    spawned pool workers, so importing modules there doesn't re-parse it.
+    """
+    if os.environ.get("_DOTENV_LOADED"):
+        return
+    load_dotenv()
+    os.environ["_DOTENV_LOADED"] = "1"
+
+
 def get_api_key() -> str | None:
     """Return the best available API key for Gemini."""
     return os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
@@ -13,6 +13,7 @@ Usage
 
 from __future__ import annotations
 
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
 
 import hashlib
@@ -27,6 +28,10 @@ OUTPUT_DIR = _BASE_DIR / "data" / "output"
 ASSETS_DIR = OUTPUT_DIR / "assets"
 MANUSCRIPT_PATH = OUTPUT_DIR / "tagged_manuscript.txt"
 
+# File writes overlap with decoding the next image. Workers only get the
+# encoded PNG bytes: MuPDF objects never leave the main thread
+_save_pool = ThreadPoolExecutor(max_workers=4)
+
 
 def deconstruct(pdf_path: str) -> str:
     """
@@ -132,6 +137,7 @@ def _extract_images(
     MIN_PIXELS = 10000
 
     results = []
+    pending: list[tuple[Future, dict]] = []
     image_list = page.get_images(full=True)
 
     for img_idx, img_info in enumerate(image_list):
@@ -153,7 +159,7 @@ def _extract_images(
                 print(f"  Size skip: {pix.width}x{pix.height} (area too small)")
                 continue
 
-            # Calculate hash for unique ID (shortened to 6 chars)
+            # PNG-encoded bytes (identical to pix.save); also hashed for the ID
             img_data = pix.tobytes()
             img_hash = hashlib.md5(img_data).hexdigest()[:6]
 
@@ -165,8 +171,7 @@ def _extract_images(
             extract_dir.mkdir(parents=True, exist_ok=True)
 
             save_path = extract_dir / filename
-            pix.save(str(save_path))
-            pix = None  # free memory
+            future = _save_pool.submit(_write_png, img_data, str(save_path))
 
             # Try to find the image position on the page
             y_pos = _get_image_y_pos(page, xref, img_idx)
@@ -174,22 +179,44 @@ def _extract_images(
             # Tag Format: [ORIGINAL_ASSET:extracted_images/filename]
             tag = f"[ORIGINAL_ASSET:extracted_images/{filename}]"
 
-            results.append(
-                {
-                    "filename": filename,
-                    "tag": tag,
-                    "y_pos": y_pos,
-                }
+            pending.append(
+                (
+                    future,
+                    {
+                        "filename": filename,
+                        "tag": tag,
+                        "y_pos": y_pos,
+                        "size": f"{img_info[2]}x{img_info[3]}",
+                        "xref": xref,
+                    },
+                )
             )
 
-            print(f"  → Saved {filename} ({img_info[2]}x{img_info[3]})")
-
         except Exception as e:
             print(f"  ⚠ Skipped image xref={xref} on page {page_num + 1}: {e}")
 
+    # Wait for background saves; only tag images that actually reached disk
+    for future, info in pending:
+        try:
+            future.result()
+        except Exception as e:
+            print(
+                f"  ⚠ Skipped image xref={info['xref']} on page {page_num + 1}: {e}"
+            )
+            continue
+        print(f"  → Saved {info['filename']} ({info['size']})")
+        results.append(
+            {"filename": info["filename"], "tag": info["tag"], "y_pos": info["y_pos"]}
+        )
+
     return results
 
 
+def _write_png(data: bytes, path: str) -> None:
+    """Write already-encoded PNG bytes to disk on a worker thread."""
+    Path(path).write_bytes(data)
+
+
 def _get_image_y_pos(page: fitz.Page, xref: int, fallback_idx: int) -> float:
     """
     Attempt to find the vertical (y) position of an image on the page
@@ -15,24 +15,46 @@ Usage:
 
 from __future__ import annotations
 
+import queue
 import sqlite3
 import json
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime
 
 DLQ_PATH = Path("data/output/dlq.db")
+POOL_SIZE = 4
 
 
 class DLQ:
     """Dead Letter Queue backed by SQLite."""
 
-    def __init__(self, db_path: Path = DLQ_PATH):
+    def __init__(self, db_path: Path = DLQ_PATH, pool_size: int = POOL_SIZE):
         db_path.parent.mkdir(parents=True, exist_ok=True)
-        self.conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        # WAL lets readers proceed alongside a single writer. Each pooled
+        # connection is checked out by one thread at a time, so handing it
+        # between threads is safe.
+        self._pool: queue.SimpleQueue[sqlite3.Connection] = queue.SimpleQueue()
+        self._all_conns: list[sqlite3.Connection] = []
+        for _ in range(pool_size):
+            conn = sqlite3.connect(str(db_path), check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._all_conns.append(conn)
+            self._pool.put(conn)
         self._init_schema()
 
+    @contextmanager
+    def _conn(self):
+        """Check a connection out of the pool for the duration of the block."""
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
     def _init_schema(self):
-        self.conn.execute("""
+        with self._conn() as conn:
+            conn.execute("""
             CREATE TABLE IF NOT EXISTS failed_chunks (
                 id          TEXT PRIMARY KEY,
                 phase       INTEGER DEFAULT 4,
@@ -44,30 +66,32 @@ class DLQ:
                 updated_at  TEXT
             )
         """)
-        self.conn.commit()
+            conn.commit()
 
     def push(self, chunk_id: str, chunk_text: str, error_msg: str, phase: int = 4):
         """Add a failed chunk to the DLQ."""
         now = datetime.utcnow().isoformat()
-        self.conn.execute(
-            """
-            INSERT OR REPLACE INTO failed_chunks
-            (id, phase, chunk_text, error_msg, retry_count, status, created_at, updated_at)
-            VALUES (?, ?, ?, ?, 0, 'pending', ?, ?)
-        """,
-            (chunk_id, phase, chunk_text, str(error_msg)[:500], now, now),
-        )
-        self.conn.commit()
+        with self._conn() as conn:
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO failed_chunks
+                (id, phase, chunk_text, error_msg, retry_count, status, created_at, updated_at)
+                VALUES (?, ?, ?, ?, 0, 'pending', ?, ?)
+            """,
+                (chunk_id, phase, chunk_text, str(error_msg)[:500], now, now),
+            )
+            conn.commit()
         print(
             f"[DLQ] ⚠️  Chunk {chunk_id} (Phase {phase}) pushed to Dead Letter Queue."
         )
 
     def get_all(self, status: str = "pending") -> list[dict]:
         """Retrieve all pending failures."""
-        rows = self.conn.execute(
-            "SELECT id, phase, chunk_text, error_msg, retry_count FROM failed_chunks WHERE status = ?",
-            (status,),
-        ).fetchall()
+        with self._conn() as conn:
+            rows = conn.execute(
+                "SELECT id, phase, chunk_text, error_msg, retry_count FROM failed_chunks WHERE status = ?",
+                (status,),
+            ).fetchall()
         return [
             {"id": r[0], "phase": r[1], "text": r[2], "error": r[3], "retries": r[4]}
             for r in rows
@@ -76,11 +100,12 @@ class DLQ:
     def mark_resolved(self, chunk_id: str):
         """Mark a chunk as successfully retried."""
         now = datetime.utcnow().isoformat()
-        self.conn.execute(
-            "UPDATE failed_chunks SET status='resolved', updated_at=? WHERE id=?",
-            (now, chunk_id),
-        )
-        self.conn.commit()
+        with self._conn() as conn:
+            conn.execute(
+                "UPDATE failed_chunks SET status='resolved', updated_at=? WHERE id=?",
+                (now, chunk_id),
+            )
+            conn.commit()
 
     def retry_all(self, processor_fn, max_retries: int = 3):
         """
@@ -107,10 +132,12 @@ class DLQ:
 
     def summary(self) -> dict:
         """Return a count of DLQ items by status."""
-        rows = self.conn.execute(
-            "SELECT status, COUNT(*) FROM failed_chunks GROUP BY status"
-        ).fetchall()
+        with self._conn() as conn:
+            rows = conn.execute(
+                "SELECT status, COUNT(*) FROM failed_chunks GROUP BY status"
+            ).fetchall()
         return {r[0]: r[1] for r in rows}
 
     def close(self):
-        self.conn.close()
+        for conn in self._all_conns:
+            conn.close()
@@ -33,7 +33,7 @@ def _should_revise(state: BookState) -> str:
     feedback = state.get("feedback", "APPROVED")
     revision_count = state.get("revision_count", 0)
 
-    if feedback.upper().startswith("APPROVED"):
+    if feedback[:8].upper() == "APPROVED":
         return END
     if revision_count >= MAX_REVISIONS:
         print(f"[Router] Hit revision cap ({revision_count}). Moving on.")
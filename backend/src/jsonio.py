@@ -0,0 +1,40 @@
+"""
+BookUdecate V1.0 — JSON Helpers
+==============================
+One place for the pipeline's JSON encode/decode. Uses orjson when it is
+installed (requirements.txt) and the stdlib otherwise. orjson's
+JSONDecodeError subclasses json.JSONDecodeError, so callers keep catching
+the stdlib exception.
+"""
+
+from __future__ import annotations
+
+import json
+
+try:
+    import orjson
+
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+
+def loads(data: str | bytes):
+    """Parse JSON from ``str`` or ``bytes``."""
+    if HAS_ORJSON:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj) -> str:
+    """Pretty JSON (2-space indent) for files people read."""
+    if HAS_ORJSON:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode("utf-8")
+    return json.dumps(obj, indent=2)
+
+
+def dumps_line(obj) -> bytes:
+    """Compact UTF-8 JSON plus a newline, for JSONL journals."""
+    if HAS_ORJSON:
+        return orjson.dumps(obj) + b"\n"
+    return json.dumps(obj, ensure_ascii=False).encode("utf-8") + b"\n"
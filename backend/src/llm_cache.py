@@ -0,0 +1,86 @@
+"""
+BookUdecate V1.0 — Content-Addressable LLM Response Cache
+=======================================================
+Disk cache for deterministic LLM stages (structurer, syllabus, triage),
+so iterative rebuilds of the same book skip calls whose inputs haven't
+changed. Entries live outside data/output, so a fresh run's purge keeps them.
+
+Layout: data/cache/<namespace>/<sha256>.json holding
+    {"model", "prompt_version", "ts_utc", "response"}
+
+Usage
+-----
+    from src import llm_cache
+    PROMPT_VERSION = llm_cache.prompt_hash(SYSTEM_PROMPT)
+    key = llm_cache.make_key(PROMPT_VERSION, model, text_chunk)
+    hit = llm_cache.get("structurer", key)
+    ...
+    llm_cache.put("structurer", key, parsed, model=model, prompt_version=PROMPT_VERSION)
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+_BASE_DIR = Path(__file__).resolve().parent.parent
+CACHE_DIR = Path(os.getenv("LLM_CACHE_DIR", str(_BASE_DIR / "data" / "cache")))
+
+# Set LLM_CACHE=false to always call the model
+ENABLED = os.getenv("LLM_CACHE", "true").lower() != "false"
+
+
+def make_key(*parts: str | bytes) -> str:
+    """SHA-256 over the NUL-joined parts (str parts are UTF-8 encoded)."""
+    return hashlib.sha256(
+        b"\x00".join(p.encode("utf-8") if isinstance(p, str) else p for p in parts)
+    ).hexdigest()
+
+
+def prompt_hash(*prompts: str) -> str:
+    """
+    Short digest of the prompt text a stage sends. Used as its cache-key
+    version, so editing a prompt retires the entries made with the old one.
+    """
+    return make_key(*prompts)[:12]
+
+
+def _entry_path(namespace: str, key: str) -> Path:
+    return CACHE_DIR / namespace / f"{key}.json"
+
+
+def get(namespace: str, key: str) -> Any | None:
+    """Return the cached response for ``key``, or ``None`` on a miss."""
+    if not ENABLED:
+        return None
+    try:
+        entry = json.loads(_entry_path(namespace, key).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None  # Missing or half-written entry: treat as a miss
+    return entry.get("response")
+
+
+def put(
+    namespace: str, key: str, response: Any, model: str = "", prompt_version: str = ""
+) -> None:
+    """Store ``response`` under ``key``; write-then-rename keeps entries whole."""
+    if not ENABLED:
+        return
+    path = _entry_path(namespace, key)
+    entry = {
+        "model": model,
+        "prompt_version": prompt_version,
+        "ts_utc": datetime.now(timezone.utc).isoformat(),
+        "response": response,
+    }
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(entry, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"[Cache] ⚠️ Could not write {namespace} entry: {e}")
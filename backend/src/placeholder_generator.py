@@ -1,4 +1,6 @@
 import os
+import textwrap
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 try:
@@ -18,9 +20,60 @@ class PlaceholderImageGenerator:
         ("#1B4F72", "#AED6F1"),  # Deep blue / sky blue
     ]
 
+    # Static background (fill + border + crosshair) per size and color scheme
+    _TEMPLATE_CACHE: dict = {}
+    # Parsed TrueType fonts by point size, and measured bboxes of static labels
+    _FONT_CACHE: dict = {}
+    _LABEL_BBOX_CACHE: dict = {}
+
     def __init__(self):
         self._color_index = 0
 
+    @classmethod
+    def _get_font(cls, size: int):
+        font = cls._FONT_CACHE.get(size)
+        if font is None:
+            try:
+                font = ImageFont.truetype("arial.ttf", size)
+            except OSError:
+                font = cls._FONT_CACHE.get("default")
+                if font is None:
+                    font = cls._FONT_CACHE["default"] = ImageFont.load_default()
+            cls._FONT_CACHE[size] = font
+        return font
+
+    @classmethod
+    def _label_bbox(cls, draw, text: str, font):
+        key = (text, id(font))
+        bbox = cls._LABEL_BBOX_CACHE.get(key)
+        if bbox is None:
+            bbox = cls._LABEL_BBOX_CACHE[key] = draw.textbbox((0, 0), text, font=font)
+        return bbox
+
+    @classmethod
+    def _get_template(cls, width: int, height: int, bg_color: str, text_color: str):
+        key = (width, height, bg_color, text_color)
+        template = cls._TEMPLATE_CACHE.get(key)
+        if template is None:
+            template = Image.new("RGB", (width, height), bg_color)
+            draw = ImageDraw.Draw(template)
+
+            # Draw border
+            border = 12
+            draw.rectangle(
+                [border, border, width - border - 1, height - border - 1],
+                outline=text_color,
+                width=4,
+            )
+
+            # Draw crosshair lines (visual placeholder indicator)
+            draw.line([(border, border), (width - border, height - border)],
+                      fill=text_color, width=2)
+            draw.line([(width - border, border), (border, height - border)],
+                      fill=text_color, width=2)
+            cls._TEMPLATE_CACHE[key] = template
+        return template
+
     def generate_image(
         self,
         description: str,
@@ -33,35 +86,16 @@ class PlaceholderImageGenerator:
         bg_color, text_color = self.COLORS[self._color_index % len(self.COLORS)]
         self._color_index += 1
 
-        img = Image.new("RGB", (width, height), bg_color)
+        img = self._get_template(width, height, bg_color, text_color).copy()
         draw = ImageDraw.Draw(img)
 
-        # Draw border
-        border = 12
-        draw.rectangle(
-            [border, border, width - border - 1, height - border - 1],
-            outline=text_color,
-            width=4,
-        )
-
-        # Draw crosshair lines (visual placeholder indicator)
-        draw.line([(border, border), (width - border, height - border)],
-                  fill=text_color, width=2)
-        draw.line([(width - border, border), (border, height - border)],
-                  fill=text_color, width=2)
-
         # Draw center label
-        try:
-            # Try to load a larger default font
-            font_large = ImageFont.truetype("arial.ttf", 64)
-            font_small = ImageFont.truetype("arial.ttf", 48)
-        except OSError:
-            font_large = ImageFont.load_default()
-            font_small = font_large
+        font_large = self._get_font(64)
+        font_small = self._get_font(48)
 
         # "PLACEHOLDER IMAGE" label
         label = "PLACEHOLDER IMAGE"
-        bbox = draw.textbbox((0, 0), label, font=font_large)
+        bbox = self._label_bbox(draw, label, font_large)
         lw, lh = bbox[2] - bbox[0], bbox[3] - bbox[1]
         lx = (width - lw) // 2
         ly = height // 2 - lh - 40
@@ -74,16 +108,17 @@ class PlaceholderImageGenerator:
         )
         draw.text((lx, ly), label, fill=text_color, font=font_large)
 
-        # Description text (wrapped)
-        wrapped = self._wrap_text(description, max_chars=60)
+        # Description text (wrapped to the measured width inside the border)
+        border, desc_pad = 12, 8
+        max_pixel_width = width - 2 * border - 2 * desc_pad - 40
+        wrapped = self._wrap_text_pixels(draw, description, font_small, max_pixel_width)
         desc_y = ly + lh + pad + 20
         for line in wrapped[:4]:  # max 4 lines
             bbox = draw.textbbox((0, 0), line, font=font_small)
             tw = bbox[2] - bbox[0]
             tx = (width - tw) // 2
-            
+
             # Background for readability
-            desc_pad = 8
             draw.rectangle(
                 [tx - desc_pad, desc_y - desc_pad, tx + tw + desc_pad, desc_y + (bbox[3] - bbox[1]) + desc_pad],
                 fill=bg_color,
@@ -91,21 +126,69 @@ class PlaceholderImageGenerator:
             draw.text((tx, desc_y), line, fill=text_color, font=font_small)
             desc_y += (bbox[3] - bbox[1]) + desc_pad * 3
 
-        img.save(output_path, quality=95)
+        img.save(output_path, **self._save_options(output_path))
         return output_path
 
+    def generate_many(
+        self, items: list[tuple[str, str]], workers: int | None = None
+    ) -> list[str]:
+        """
+        Render many ``(description, output_path)`` placeholders in parallel.
+        Color schemes are assigned up front in order, so the result matches
+        calling ``generate_image`` sequentially.
+        """
+        if not items:
+            return []
+        start = self._color_index
+        self._color_index += len(items)
+        jobs = [(desc, path, start + i) for i, (desc, path) in enumerate(items)]
+        workers = min(workers or os.cpu_count() or 1, len(jobs))
+        if workers <= 1:
+            return [_generate_in_worker(*job) for job in jobs]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(_generate_in_worker, *zip(*jobs)))
+
     @staticmethod
-    def _wrap_text(text: str, max_chars: int = 60) -> list[str]:
-        words = text.split()
+    def _save_options(output_path: str) -> dict:
+        """Fastest encoder settings for the target format (flat-color art)."""
+        ext = os.path.splitext(output_path)[1].lower()
+        if ext in (".jpg", ".jpeg"):
+            return {
+                "quality": 90,
+                "optimize": False,
+                "progressive": False,
+                "subsampling": 2,
+            }
+        if ext == ".webp":
+            return {"quality": 85, "method": 0}
+        # PNG: zlib level 1 skips most of the default level-6 search effort
+        return {"compress_level": 1}
+
+    @staticmethod
+    def _wrap_text_pixels(draw, text: str, font, max_pixel_width: int) -> list[str]:
+        """Greedy word wrap by rendered width; falls back to a char-count wrap."""
+        if not hasattr(draw, "textlength"):  # Pillow < 9.2
+            return PlaceholderImageGenerator._wrap_text(text)
         lines = []
         current = ""
-        for word in words:
-            if len(current) + len(word) + 1 <= max_chars:
-                current = f"{current} {word}" if current else word
+        for word in text.split():
+            trial = f"{current} {word}" if current else word
+            if not current or draw.textlength(trial, font=font) <= max_pixel_width:
+                current = trial
             else:
-                if current:
-                    lines.append(current)
+                lines.append(current)
                 current = word
         if current:
             lines.append(current)
         return lines
+
+    @staticmethod
+    def _wrap_text(text: str, max_chars: int = 60) -> list[str]:
+        return textwrap.wrap(text, max_chars, break_long_words=False)
+
+
+def _generate_in_worker(description: str, output_path: str, color_index: int) -> str:
+    """Process-pool entry point: render one placeholder with a fixed color scheme."""
+    gen = PlaceholderImageGenerator()
+    gen._color_index = color_index
+    return gen.generate_image(description, output_path)
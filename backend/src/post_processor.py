@@ -9,16 +9,127 @@ Fixes for:
 
 from __future__ import annotations
 
+import heapq
 import re
+from bisect import bisect_right
 from difflib import SequenceMatcher
 from typing import Dict, Any, List
 
+# Optional: MinHash-LSH for global (non-adjacent) near-duplicate detection
+try:
+    from datasketch import MinHash, MinHashLSH
 
-def _similarity(a: str, b: str) -> float:
-    """Return 0-1 similarity ratio between two strings."""
-    if not a or not b:
-        return 0.0
-    return SequenceMatcher(None, a.strip(), b.strip()).ratio()
+    HAS_DATASKETCH = True
+except ImportError:
+    HAS_DATASKETCH = False
+
+# Optional: xxHash for fast 64-bit paragraph fingerprints
+try:
+    import xxhash
+
+    HAS_XXHASH = True
+except ImportError:
+    HAS_XXHASH = False
+
+# Optional: rapidfuzz C++ kernel for paragraph similarity (difflib fallback)
+try:
+    from rapidfuzz import fuzz
+
+    HAS_RAPIDFUZZ = True
+except ImportError:
+    HAS_RAPIDFUZZ = False
+
+# Optional: Hyperscan DFA for scanning all restart patterns in one pass
+try:
+    import hyperscan
+
+    HAS_HYPERSCAN = True
+except ImportError:
+    HAS_HYPERSCAN = False
+
+MINHASH_PERMUTATIONS = 128
+SHINGLE_WORDS = 5
+_WORD_RE = re.compile(r"\w+")
+_WS_RE = re.compile(r"\s+")
+
+# LLM looping: the same sentence/line emitted back to back. Technical prose
+# legitimately repeats its key terms, so only whole-unit runs count
+_UNIT_RE = re.compile(r"[^\n.!?]+[.!?]*")
+LOOP_MIN_REPEATS = 3  # Identical consecutive units before a run is a loop
+LOOP_MIN_CHARS = 20  # Shorter units ("Yes.", "0.5") may repeat legitimately
+
+
+def _ratio_at_least(sm: SequenceMatcher, threshold: float) -> float:
+    """
+    Run the ``real_quick_ratio → quick_ratio → ratio`` ladder on a prepared
+    matcher. Both quick ratios are upper bounds on ``ratio()``, so a pair
+    that fails either one is returned early without the O(n·m) match.
+    """
+    bound = sm.real_quick_ratio()
+    if bound < threshold:
+        return bound
+    bound = sm.quick_ratio()
+    if bound < threshold:
+        return bound
+    return sm.ratio()
+
+
+def _fingerprint(block: str) -> int:
+    """64-bit hash of a block with whitespace collapsed and case folded."""
+    normalized = _WS_RE.sub(" ", block).lower()
+    if HAS_XXHASH:
+        return xxhash.xxh64_intdigest(normalized.encode("utf-8"))
+    return hash(normalized)
+
+
+def _is_prose(block: str) -> bool:
+    """
+    True for a plain prose block. Markup (``#func``, ``= heading``, ``$``
+    math) and fragments of a bracketed construct split across blank lines
+    are not whole units, so dropping one could unbalance the document.
+    """
+    return not block.startswith(("#", "=", "$")) and block.count("[") == block.count("]")
+
+
+def _minhash(block: str) -> "MinHash":
+    """MinHash signature over the block's 5-word shingles."""
+    words = _WORD_RE.findall(block.lower())
+    mh = MinHash(num_perm=MINHASH_PERMUTATIONS)
+    for i in range(max(len(words) - SHINGLE_WORDS + 1, 1)):
+        mh.update(" ".join(words[i : i + SHINGLE_WORDS]).encode("utf-8"))
+    return mh
+
+
+def _collapse_loops(block: str) -> str:
+    """
+    Keep one copy of any sentence or line repeated ``LOOP_MIN_REPEATS`` or
+    more times in a row (whitespace and case ignored). Everything else in the
+    block, including its original spacing, is left untouched.
+    """
+    units = [m for m in _UNIT_RE.finditer(block) if m.group().strip()]
+    cuts = []
+    i = 0
+    while i < len(units):
+        key = _WS_RE.sub(" ", units[i].group()).strip().lower()
+        j = i + 1
+        if len(key) >= LOOP_MIN_CHARS:
+            while (
+                j < len(units)
+                and _WS_RE.sub(" ", units[j].group()).strip().lower() == key
+                and not block[units[j - 1].end() : units[j].start()].strip()
+            ):
+                j += 1
+        if j - i >= LOOP_MIN_REPEATS:
+            cuts.append((units[i].end(), units[j - 1].end()))
+        i = j
+    if not cuts:
+        return block
+    parts, pos = [], 0
+    for start, end in cuts:
+        parts.append(block[pos:start])
+        pos = end
+    parts.append(block[pos:])
+    return "".join(parts)
 
 
 # ──────────────────────────────────────────────
@@ -32,6 +143,20 @@ def deduplicate_paragraphs(latex: str, threshold: float = 0.85) -> str:
 
     Splits on double-newline, compares adjacent blocks, and removes
     any block that's >85% similar to the previous one.
+
+    Long blocks that are exact repeats (ignoring whitespace and case) of
+    any earlier kept block are dropped by fingerprint before any similarity
+    work, since LLM retries usually duplicate text verbatim.
+
+    The fingerprint, loop and LSH checks below reach across the whole body,
+    so they only ever touch plain prose blocks (see ``_is_prose``).
+
+    Prose blocks where the same sentence or line repeats three or more times
+    in a row (LLM looping) keep one copy of it; the rest of the block stays.
+
+    When ``datasketch`` is installed, long blocks are also indexed in a
+    MinHash-LSH so near-duplicates anywhere earlier in the body are removed,
+    not just the immediately preceding block.
     """
     blocks = re.split(r"\n\s*\n", latex)
     if len(blocks) <= 1:
@@ -39,29 +164,89 @@ def deduplicate_paragraphs(latex: str, threshold: float = 0.85) -> str:
 
     deduped = [blocks[0]]
     removed = 0
+    looped = 0
+
+    # seq2 holds the previous kept block; SequenceMatcher caches its index,
+    # so it is only rebuilt when a new block is kept.
+    previous = blocks[0].strip()
+    prev_len = len(previous)
+    sm = SequenceMatcher(None)
+    if not HAS_RAPIDFUZZ:
+        sm.set_seq2(previous)
+
+    global_ok = len(previous) >= 100 and _is_prose(previous)
+    seen = {_fingerprint(previous)} if global_ok else set()
+
+    lsh = None
+    signatures: Dict[str, Any] = {}
+    if HAS_DATASKETCH:
+        lsh = MinHashLSH(threshold=threshold, num_perm=MINHASH_PERMUTATIONS)
+        if global_ok:
+            signatures["0"] = _minhash(previous)
+            lsh.insert("0", signatures["0"])
 
     for i in range(1, len(blocks)):
         current = blocks[i].strip()
-        previous = deduped[-1].strip()
 
         # Skip empty blocks
         if not current:
             continue
 
-        # Skip very short blocks (headings, labels) — don't dedup those
-        if len(current) < 100:
-            deduped.append(blocks[i])
+        cur_len = len(current)
+        global_ok = cur_len >= 100 and _is_prose(current)
+        if global_ok:
+            # Cheap O(len) pass first: collapse a looping sentence so the
+            # copies never reach the fingerprint or similarity checks
+            collapsed = _collapse_loops(current)
+            if collapsed != current:
+                looped += 1
+                current = blocks[i] = collapsed
+                cur_len = len(current)
+        fingerprint = _fingerprint(current) if global_ok else None
+        if fingerprint is not None and fingerprint in seen:
+            removed += 1
             continue
 
-        sim = _similarity(current, previous)
-        if sim >= threshold:
-            removed += 1
-            continue  # Skip this duplicate
+        # Skip very short blocks (headings, labels) — don't dedup those.
+        # Pairs whose lengths alone cap the ratio below the threshold
+        # (2·min / (a+b) < threshold) never reach a similarity kernel.
+        if cur_len >= 100 and prev_len:
+            if 2 * min(cur_len, prev_len) >= threshold * (cur_len + prev_len):
+                if HAS_RAPIDFUZZ:
+                    score = fuzz.ratio(
+                        current, previous, score_cutoff=threshold * 100
+                    ) / 100.0
+                else:
+                    sm.set_seq1(current)
+                    score = _ratio_at_least(sm, threshold)
+                if score >= threshold:
+                    removed += 1
+                    continue  # Skip this duplicate
+
+        if lsh is not None and global_ok:
+            mh = _minhash(current)
+            # LSH buckets admit false positives; confirm on the signatures
+            if any(
+                mh.jaccard(signatures[key]) >= threshold for key in lsh.query(mh)
+            ):
+                removed += 1
+                continue
+            key = str(i)
+            lsh.insert(key, mh)
+            signatures[key] = mh
 
+        if fingerprint is not None:
+            seen.add(fingerprint)
         deduped.append(blocks[i])
+        previous = current
+        prev_len = cur_len
+        if not HAS_RAPIDFUZZ:
+            sm.set_seq2(previous)
 
     if removed > 0:
         print(f"[PostProcessor] 🧹 Removed {removed} duplicate paragraph(s)")
+    if looped > 0:
+        print(f"[PostProcessor] 🧹 Collapsed repeated sentences in {looped} paragraph(s)")
 
     return "\n\n".join(deduped)
 
@@ -71,6 +256,26 @@ def deduplicate_paragraphs(latex: str, threshold: float = 0.85) -> str:
 # ──────────────────────────────────────────────
 
 
+def _cheap_len(node: Any) -> int:
+    """
+    Estimate content length of a chapter by summing the lengths of every
+    string key and value, walked with an explicit stack (no serialization).
+    """
+    total = 0
+    stack = [node]
+    while stack:
+        cur = stack.pop()
+        if isinstance(cur, str):
+            total += len(cur)
+        elif isinstance(cur, dict):
+            for k, v in cur.items():
+                total += len(k)
+                stack.append(v)
+        elif isinstance(cur, list):
+            stack.extend(cur)
+    return total
+
+
 def merge_micro_chapters(
     chapters: List[Dict[str, Any]], min_chars: int = 3000, max_chapters: int = 60
 ) -> List[Dict[str, Any]]:
@@ -86,22 +291,14 @@ def merge_micro_chapters(
     if not chapters or len(chapters) <= 1:
         return chapters
 
-    def _chapter_text_len(ch: Dict) -> int:
-        """Estimate content length of a chapter using JSON dump size."""
-        import json
-
-        try:
-            return len(json.dumps(ch, ensure_ascii=False))
-        except Exception:
-            return 0
-
     # Pass 1: Merge chapters below min_chars into preceding chapter
     merged = [chapters[0]]
+    lengths = [_cheap_len(chapters[0])]  # kept in step with `merged`
     merge_count = 0
 
     for i in range(1, len(chapters)):
         ch = chapters[i]
-        ch_len = _chapter_text_len(ch)
+        ch_len = _cheap_len(ch)
 
         if ch_len < min_chars and merged:
             # Merge this micro-chapter into the previous one
@@ -109,9 +306,11 @@ def merge_micro_chapters(
             prev_sections = prev.get("sections", [])
             new_sections = ch.get("sections", [])
             prev["sections"] = prev_sections + new_sections
+            lengths[-1] += ch_len
             merge_count += 1
         else:
             merged.append(ch)
+            lengths.append(ch_len)
 
     if merge_count > 0:
         print(
@@ -119,22 +318,48 @@ def merge_micro_chapters(
             f"({len(chapters)} → {len(merged)} chapters)"
         )
 
-    # Pass 2: If still over max_chapters, merge the shortest adjacent pairs
-    while len(merged) > max_chapters:
-        # Find shortest adjacent pair
-        min_combined = float("inf")
-        min_idx = 0
-        for i in range(len(merged) - 1):
-            combined = _chapter_text_len(merged[i]) + _chapter_text_len(merged[i + 1])
-            if combined < min_combined:
-                min_combined = combined
-                min_idx = i
-
-        # Merge the pair
-        merged[min_idx]["sections"] = merged[min_idx].get("sections", []) + merged[
-            min_idx + 1
-        ].get("sections", [])
-        merged.pop(min_idx + 1)
+    # Pass 2: If still over max_chapters, merge the shortest adjacent pairs.
+    # Pairs sit in a min-heap keyed by (combined length, left index) over a
+    # linked list of surviving chapters; entries made stale by a merge are
+    # skipped when popped (lazy deletion).
+    count = len(merged)
+    if count > max_chapters:
+        nxt = list(range(1, count + 1))
+        prv = list(range(-1, count - 1))
+        alive = [True] * count
+        heap = [(lengths[i] + lengths[i + 1], i, i + 1) for i in range(count - 1)]
+        heapq.heapify(heap)
+
+        while count > max_chapters:
+            combined, left, right = heapq.heappop(heap)
+            if (
+                not alive[left]
+                or nxt[left] != right
+                or combined != lengths[left] + lengths[right]
+            ):
+                continue  # Stale entry
+
+            # Merge the pair
+            merged[left]["sections"] = merged[left].get("sections", []) + merged[
+                right
+            ].get("sections", [])
+            lengths[left] += lengths[right]
+            alive[right] = False
+            nxt[left] = nxt[right]
+            if nxt[left] < len(merged):
+                prv[nxt[left]] = left
+            count -= 1
+
+            if prv[left] >= 0:
+                heapq.heappush(
+                    heap, (lengths[prv[left]] + lengths[left], prv[left], left)
+                )
+            if nxt[left] < len(merged):
+                heapq.heappush(
+                    heap, (lengths[left] + lengths[nxt[left]], left, nxt[left])
+                )
+
+        merged = [ch for ch, keep in zip(merged, alive) if keep]
 
     return merged
 
@@ -143,6 +368,75 @@ def merge_micro_chapters(
 # FAULT #8: Strip syllabus restarts
 # ──────────────────────────────────────────────
 
+# Patterns that indicate a syllabus restart
+_RESTART_PATTERNS = [
+    r"^\s*(?:Course|Unit|Module)\s+(?:Objectives|Overview|Introduction)\s*:?\s*$",
+    r"^\s*(?:Learning\s+Outcomes?|Syllabus\s+Coverage)\s*:?\s*$",
+    r"In\s+this\s+(?:unit|module|course),?\s+(?:we\s+will|students?\s+will|you\s+will)\s+(?:learn|study|cover|explore)",
+    r"The\s+(?:syllabus|curriculum|course)\s+(?:covers?|includes?|encompasses?)",
+    r"^\s*(?:UNIT|Unit)\s+\d+\s*[-:]\s*(?:Introduction|Overview|Basics)",
+]
+_SYLLABUS_RESTART_RE = re.compile(
+    "|".join(f"(?:{p})" for p in _RESTART_PATTERNS), re.IGNORECASE
+)
+
+# Whole-line form for a single MULTILINE pass over the text: ``\s`` may
+# not cross a newline, so each match stays inside the line it started on.
+_SYLLABUS_LINE_RE = re.compile(
+    r"^[^\n]*?(?:"
+    + "|".join(f"(?:{p})" for p in _RESTART_PATTERNS).replace(r"\s", r"[^\S\n]")
+    + r")[^\n]*\n",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+_hs_db = None
+
+
+def _restart_db():
+    """
+    Lazily compile the restart patterns into a Hyperscan database.
+    ``\\s`` is narrowed to non-newline whitespace so a whole-document scan
+    keeps the per-line semantics of ``re.search(pattern, line)``.
+    """
+    global _hs_db
+    if _hs_db is None:
+        db = hyperscan.Database()
+        db.compile(
+            expressions=[
+                p.replace(r"\s", r"[^\S\n]").encode("utf-8")
+                for p in _RESTART_PATTERNS
+            ],
+            ids=list(range(len(_RESTART_PATTERNS))),
+            elements=len(_RESTART_PATTERNS),
+            flags=[
+                hyperscan.HS_FLAG_CASELESS
+                | hyperscan.HS_FLAG_MULTILINE
+                | hyperscan.HS_FLAG_UTF8
+                | hyperscan.HS_FLAG_UCP
+            ]
+            * len(_RESTART_PATTERNS),
+        )
+        _hs_db = db
+    return _hs_db
+
+
+def _restart_line_indices(lines: List[str]) -> set[int]:
+    """Indices of lines matching any restart pattern, from one Hyperscan pass."""
+    encoded = [line.encode("utf-8") for line in lines]
+    line_starts = []
+    offset = 0
+    for raw in encoded:
+        line_starts.append(offset)
+        offset += len(raw) + 1  # + "\n"
+
+    hits: set[int] = set()
+
+    def _on_match(_id, _start, end, _flags, _ctx):
+        hits.add(bisect_right(line_starts, end - 1) - 1)
+
+    _restart_db().scan(b"\n".join(encoded), match_event_handler=_on_match)
+    return hits
+
 
 def strip_syllabus_restarts(latex: str) -> str:
     """
@@ -154,52 +448,53 @@ def strip_syllabus_restarts(latex: str) -> str:
     - "In this unit, we will learn..." / "The syllabus covers..."
     - "Course objectives:" / "Learning outcomes:"
     """
-    # Split into chunks by \\chapter or \\section
-    # Only strip from chapter 2 onwards
-
-    # Patterns that indicate a syllabus restart
-    restart_patterns = [
-        r"(?i)^\s*(?:Course|Unit|Module)\s+(?:Objectives|Overview|Introduction)\s*:?\s*$",
-        r"(?i)^\s*(?:Learning\s+Outcomes?|Syllabus\s+Coverage)\s*:?\s*$",
-        r"(?i)In\s+this\s+(?:unit|module|course),?\s+(?:we\s+will|students?\s+will|you\s+will)\s+(?:learn|study|cover|explore)",
-        r"(?i)The\s+(?:syllabus|curriculum|course)\s+(?:covers?|includes?|encompasses?)",
-        r"(?i)^\s*(?:UNIT|Unit)\s+\d+\s*[-:]\s*(?:Introduction|Overview|Basics)",
-    ]
-
-    # Only apply after the first \\chapter{} or after line 200
-    lines = latex.split("\n")
-    first_chapter_line = 0
-    for i, line in enumerate(lines):
-        if "\\chapter{" in line:
-            first_chapter_line = i
-            break
-
-    if first_chapter_line == 0:
+    # Locate \\chapter{ lines with C-level find() instead of a per-line probe.
+    # Stripping starts at the third distinct chapter line (allow ch1 & ch2
+    # to have intros); nothing is touched if the first chapter is on line 0.
+    # Newlines are counted incrementally between hits, so the text before
+    # the third chapter is scanned once rather than once per hit.
+    chapter_lines: list[int] = []
+    strip_offset = 0
+    line_no = 0
+    counted_to = 0
+    pos = latex.find("\\chapter{")
+    while pos >= 0 and len(chapter_lines) < 3:
+        line_no += latex.count("\n", counted_to, pos)
+        counted_to = pos
+        if not chapter_lines or chapter_lines[-1] != line_no:
+            chapter_lines.append(line_no)
+            strip_offset = latex.rfind("\n", 0, pos) + 1
+        pos = latex.find("\\chapter{", pos + 9)
+
+    if not chapter_lines or chapter_lines[0] == 0:
         return latex  # No chapters found, don't touch
 
-    chapter_count = 0
-    cleaned_lines = []
-    for i, line in enumerate(lines):
-        if "\\chapter{" in line:
-            chapter_count += 1
-
-        # Only strip from chapter 3 onwards (allow ch1 & ch2 to have intros)
-        if chapter_count >= 3:
-            should_strip = False
-            for pattern in restart_patterns:
-                if re.search(pattern, line):
-                    should_strip = True
-                    break
-            if should_strip:
-                continue  # Skip this line
-
-        cleaned_lines.append(line)
-
-    removed = len(lines) - len(cleaned_lines)
-    if removed > 0:
-        print(f"[PostProcessor] 🔄 Stripped {removed} syllabus restart line(s)")
+    if len(chapter_lines) < 3:
+        return latex
+
+    # Lines before the third chapter are never scanned, split or re-joined.
+    head = latex[:strip_offset]
+    if HAS_HYPERSCAN:
+        tail = latex[strip_offset:].split("\n")
+        restart_lines = _restart_line_indices(tail)
+        removed = len(restart_lines)
+        cleaned = "".join(
+            line + "\n" for i, line in enumerate(tail) if i not in restart_lines
+        )
+    else:
+        # One regex pass over the tail; the extra newline gives the last
+        # line a terminator so every removed line takes its own "\n" along
+        cleaned, removed = _SYLLABUS_LINE_RE.subn("", latex[strip_offset:] + "\n")
+
+    if removed == 0:
+        return latex
+    print(f"[PostProcessor] 🔄 Stripped {removed} syllabus restart line(s)")
 
-    return "\n".join(cleaned_lines)
+    # Drop the terminator added to the last kept line, or the separator
+    # before the tail if every tail line was removed
+    if not cleaned:
+        return head[:-1]
+    return head + cleaned[:-1]
 
 
 # ──────────────────────────────────────────────
@@ -234,7 +529,6 @@ def strip_heading_only_chapters(chapters: List[Dict[str, Any]]) -> List[Dict[str
     Remove chapters that contain only headings with no actual text content.
     These produce pages with just a title and nothing else.
     """
-    import json
 
     def _has_real_content(ch: Dict) -> bool:
         """Check if a chapter has any substantive content beyond headings."""
@@ -0,0 +1,98 @@
+"""
+BookUdecate V1.0 — Proactive Rate Limiting
+=========================================
+Async token-bucket limiter shared by every LLM call for a given provider,
+so requests are pre-throttled to the provider's known RPM instead of
+reacting to 429s after the fact.
+
+Per-provider limits are read from the environment:
+    GEMINI_RPM  (default: 60)
+    OLLAMA_RPM  (default: 60)
+    <PROVIDER>_RPM for any other LiteLLM provider prefix
+
+Usage
+-----
+    from src.ratelimit import get_bucket
+    await get_bucket(model).acquire()
+    ...
+    get_bucket(model).cooldown(delay)   # on a 429: pause the whole provider
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import random
+import time
+
+DEFAULT_RPM = 60
+
+
+class TokenBucket:
+    """Async token bucket refilling at ``rate`` tokens/second up to ``capacity``."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+        self._loop = None
+        # Provider-wide hold set after a 429 (monotonic deadline)
+        self._cooldown_until = 0.0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    def cooldown(self, seconds: float) -> None:
+        """
+        Hold every caller of this provider for ``seconds`` (e.g. after a 429),
+        so concurrent requests wait instead of firing into the same throttle.
+        """
+        self._cooldown_until = max(self._cooldown_until, time.monotonic() + seconds)
+
+    async def acquire(self, tokens: float = 1) -> None:
+        """Wait until ``tokens`` are available, then consume them."""
+        # Pipeline phases each run their own asyncio.run(); a lock bound to a
+        # finished loop would raise, so rebind when the loop changes.
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            wait = self._cooldown_until - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._refill()
+            while self._tokens < tokens:
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= tokens
+
+
+_BUCKETS: dict[str, TokenBucket] = {}
+
+
+def _provider_of(model: str) -> str:
+    """Return the LiteLLM provider prefix of a model id (``gemini/x`` → ``gemini``)."""
+    return model.split("/", 1)[0].lower() if "/" in model else "default"
+
+
+def get_bucket(model: str) -> TokenBucket:
+    """Return the shared bucket for the provider serving ``model``."""
+    provider = _provider_of(model)
+    bucket = _BUCKETS.get(provider)
+    if bucket is None:
+        rpm = float(os.getenv(f"{provider.upper()}_RPM", str(DEFAULT_RPM)))
+        bucket = TokenBucket(rate=rpm / 60.0, capacity=max(rpm / 60.0, 1.0))
+        _BUCKETS[provider] = bucket
+    return bucket
+
+
+def backoff_delay(attempt: int, base: float = 2.0, cap: float = 30.0) -> float:
+    """Exponential backoff with up to 50% jitter, capped at ``cap`` seconds."""
+    return min(cap, base * 2**attempt * (1 + random.random() * 0.5))
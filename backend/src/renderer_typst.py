@@ -1,28 +1,89 @@
-import regex as re
+import os
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from io import StringIO
+from pathlib import Path
+
+import re
 from typing import Dict, List, Any
 
+# Typst uses $...$ for both inline and display math. LLMs might still output
+# $$...$$ for display math occasionally, so we handle both.
+# Bodies are character classes instead of lazy dots, and each run is made
+# atomic with the (?=(X))\1 idiom (stdlib re has no possessives before 3.11),
+# so unclosed delimiters in malformed LLM output can't make the scan backtrack.
+_MATH_PATTERN = r"\$\$(?=(?P<_dm>(?:[^$]|\$(?!\$))*))(?P=_dm)\$\$|\$(?=(?P<_im>[^$]*))(?P=_im)\$"
+_MATH_SPLIT_RE = re.compile(_MATH_PATTERN)
+# Markdown images ![alt](path). Paragraphs are split on images first and
+# math is only tokenized between them, so a $ on either side of an image
+# can never pull the image markup into a math span
+_IMAGE_RE = re.compile(r"!\[(?=(?P<alt>[^\]]*))(?P=alt)\]\((?=(?P<path>[^)]+))(?P=path)\)")
+
+# Line breaks inside a list item that are followed by more content
+_LIST_CONTINUATION_RE = re.compile(r"\n(?=[^\n])")
+
+# Sanitizer: non-breaking space → space, zero-width space dropped
+_SANITIZE_TABLE = str.maketrans({"\u00a0": " ", "\u200b": None})
+
+# Unit headings beyond the syllabus' five units are dropped
+_UNIT_RE = re.compile(r"UNIT\s+([IVXLCDM\d]+)")
+_VALID_UNITS = frozenset({"1", "2", "3", "4", "5", "I", "II", "III", "IV", "V"})
+
+# Typst special chars: # $ * _ < > @ \ `
+# We only escape the ones likely to cause syntax errors in plain text.
+_ESC_TABLE = str.maketrans({
+    "#": r"\#",
+    "$": r"\$",
+    "*": r"\*",
+    "_": r"\_",
+    "<": r"\<",
+    ">": r"\>",
+    "@": r"\@",
+    "\\": r"\\",
+    "`": r"\`",
+    "~": r"\~",
+})
+_ESC_CHARS_RE = re.compile(r"[#$*_<>@\\`~]")
+
+# Hash of this module's source: any renderer change invalidates the
+# on-disk rendered chapters without anyone having to bump a version
+_RENDERER_HASH = hashlib.blake2b(Path(__file__).read_bytes(), digest_size=16).digest()
+
+# Repeated short strings (headings, bullets, step math) are memoized; long
+# paragraphs bypass the caches so memory stays bounded.
+_MEMO_MAX_LEN = 2048
+
+
 def escape_typst(text: str) -> str:
     """
     Escapes Typst special characters in normal text.
     """
     if not text:
         return ""
-    # Typst special chars: # $ * _ < > @ \ ` 
-    # We only escape the ones likely to cause syntax errors in plain text.
-    replacements = {
-        "#": r"\#",
-        "$": r"\$",
-        "*": r"\*",
-        "_": r"\_",
-        "<": r"\<",
-        ">": r"\>",
-        "@": r"\@",
-        "\\": r"\\",
-        "`": r"\`",
-        "~": r"\~",
-    }
-    escaped = "".join(replacements.get(c, c) for c in text)
-    return escaped
+    if len(text) < _MEMO_MAX_LEN:
+        return _escape_typst_cached(text)
+    return _escape_typst(text)
+
+
+def _escape_typst(text: str) -> str:
+    if not _ESC_CHARS_RE.search(text):
+        return text  # Nothing to escape: skip the translate allocation
+    return text.translate(_ESC_TABLE)
+
+
+_escape_typst_cached = lru_cache(maxsize=8192)(_escape_typst)
+
+
+def _render_math(part: str) -> str:
+    """
+    Renders a matched `$$ ... $$` (display) or `$ ... $` (inline) segment.
+    """
+    if part.startswith("$$") and part.endswith("$$"):
+        return f"$ {part[2:-2].strip()} $"
+    # If math content has no spaces, it's inline. If we want display, user normally spaces it.
+    return f"${part[1:-1].strip()}$"
 
 
 def render_mixed_content_typst(text: str) -> str:
@@ -32,195 +93,294 @@ def render_mixed_content_typst(text: str) -> str:
     """
     if not text:
         return ""
+    if len(text) < _MEMO_MAX_LEN:
+        return _render_mixed_content_cached(text)
+    return _render_mixed_content(text)
+
+
+def _render_mixed_content(text: str) -> str:
+    if "$" not in text:
+        return escape_typst(text)  # No math delimiters: skip the split
 
-    # Typst uses $...$ for both inline and display math. 
     # Display math is just $...$ with at least one space/newline inside the delimiters.
-    # LLMs might still output $$...$$ for display math occasionally, so we handle both.
-    pattern = r"(\$\$.*?\$\$|\$.*?\$)"
-    parts = re.split(pattern, text, flags=re.DOTALL)
-    typst_out = []
-
-    for part in parts:
-        if not part:
-            continue
-
-        if part.startswith("$$") and part.endswith("$$"):
-            math_content = part[2:-2].strip()
-            typst_out.append(f"$ {math_content} $")
-        elif part.startswith("$") and part.endswith("$"):
-            math_content = part[1:-1].strip()
-            # If math content has no spaces, it's inline. If we want display, user normally spaces it.
-            typst_out.append(f"${math_content}$")
-        else:
-            if part.strip():
-                # Text node -> Escape it
-                escaped = escape_typst(part)
-                typst_out.append(escaped)
-            else:
-                # Preserve whitespace
-                if part:
-                    typst_out.append(part)
+    # One finditer walk: text between matches is escaped as it is written.
+    out = StringIO()
+    last = 0
+    for m in _MATH_SPLIT_RE.finditer(text):
+        start = m.start()
+        if start != last:
+            out.write(escape_typst(text[last:start]))
+        out.write(_render_math(m.group(0)))
+        last = m.end()
+
+    tail = text[last:]
+    if tail == "$":
+        out.write("$$")  # A lone trailing delimiter renders as empty math
+    else:
+        out.write(escape_typst(tail))
+    return out.getvalue()
 
-    return "".join(typst_out)
+
+_render_mixed_content_cached = lru_cache(maxsize=4096)(_render_mixed_content)
+
+
+def _render_figure(alt: str, path: str) -> str:
+    """
+    Renders one markdown image as a Typst figure.
+    """
+    alt = alt.strip()
+    path = path.strip().replace("\\", "/")
+
+    # Normalize path: strip leading /data/output/ if present
+    if path.startswith("/data/output/"):
+        path = path[len("/data/output/"):]
+
+    caption = escape_typst(alt) if alt else ""
+
+    if caption:
+        return f'#figure(image("{path}", width: 90%), caption: [{caption}])\n'
+    return f'#figure(image("{path}", width: 90%))\n'
 
 
 def render_paragraph_with_images(text: str) -> str:
     """
     Detects markdown image syntax `![alt](path)` inside a paragraph and
     converts it to Typst figure environments.
+
+    Text runs between figures are rendered math-aware and become their
+    own paragraphs.
     """
-    image_pattern = re.compile(r"!\[([^\]]*)\]\(([^)]+)\)")
-    out: List[str] = []
-    last_end = 0
+    out = StringIO()
+    last = 0
 
-    for match in image_pattern.finditer(text):
-        before = text[last_end : match.start()]
+    for m in _IMAGE_RE.finditer(text):
+        before = text[last : m.start()]
         if before.strip():
-            out.append(escape_typst(before) + "\n\n")
+            out.write(render_mixed_content_typst(before))
+            out.write("\n\n")
+        out.write(_render_figure(m.group("alt"), m.group("path")))
+        last = m.end()
 
-        alt = match.group(1).strip()
-        path = match.group(2).strip().replace("\\", "/")
+    after = text[last:]
+    if after.strip():
+        out.write(render_mixed_content_typst(after))
+        out.write("\n\n")
 
-        # Normalize path: strip leading /data/output/ if present
-        path = re.sub(r"^/data/output/", "", path)
-        
-        caption = escape_typst(alt) if alt else ""
+    return out.getvalue()
 
-        if caption:
-            figure_typst = f'#figure(image("{path}", width: 90%), caption: [{caption}])\n'
-        else:
-            figure_typst = f'#figure(image("{path}", width: 90%))\n'
-            
-        out.append(figure_typst)
-        last_end = match.end()
 
-    after = text[last_end:]
-    if after.strip():
-        out.append(escape_typst(after) + "\n\n")
+def _render_text(text: str) -> str:
+    """
+    Renders inline text that may embed markdown images (list items,
+    problem statements, solution steps). The substring gate keeps the
+    image regex off the common image-free path.
+    """
+    if "![" in text and "](" in text:
+        return render_paragraph_with_images(text).rstrip("\n")
+    return render_mixed_content_typst(text)
 
-    return "".join(out)
 
+def _strip_math_delimiters(math_str: str) -> str:
+    """
+    Strips surrounding `$$ ... $$` or `$ ... $` from an equation string.
+    """
+    math_str = math_str.strip()
+    if math_str.startswith("$$") and math_str.endswith("$$"):
+        return math_str[2:-2].strip()
+    if math_str.startswith("$") and math_str.endswith("$"):
+        return math_str[1:-1].strip()
+    return math_str
 
-def render_section_typst(section: Dict[str, Any]) -> str:
+
+def render_section_typst(section: Dict[str, Any], buf: StringIO = None) -> str:
     """
     Renders a single structure block into Typst syntax.
+
+    With ``buf``, output is written into the shared buffer and ``""`` is
+    returned; otherwise the rendered block is returned as a string.
     """
+    if buf is None:
+        buf = StringIO()
+        render_section_typst(section, buf)
+        return buf.getvalue()
     if not section:
         return ""
+    write = buf.write
     stype = section.get("type")
 
     if stype == "heading":
         level = section.get("level", 1)
         text = render_mixed_content_typst(section.get("text", ""))
-        
+
         # Typst uses = for headers (=, ==, ===)
-        header_marker = "=" * level
-        return f"{header_marker} {text}\n"
+        write("=" * level)
+        write(" ")
+        write(text)
+        write("\n")
 
     elif stype == "paragraph":
         text = section.get("text", "")
         if "![" in text and "](" in text:
-            rendered = render_paragraph_with_images(text)
-            return rendered + "\n\n"
-
-        text = render_mixed_content_typst(text)
-        return f"{text}\n\n"
+            write(render_paragraph_with_images(text))
+        else:
+            write(render_mixed_content_typst(text))
+        write("\n\n")
 
     elif stype == "equation":
-        # Check if the math block already includes $ delimiters
-        math_str = section.get("math", section.get("latex", ""))
-        math_str = math_str.strip()
-        
-        if math_str.startswith("$$") and math_str.endswith("$$"):
-            math_str = math_str[2:-2].strip()
-            return f"$ {math_str} $\n\n"
-        elif math_str.startswith("$") and math_str.endswith("$"):
-            math_str = math_str[1:-1].strip()
-            return f"$ {math_str} $\n\n"
-        else:
-            # Wrap unmarked math as display math
-            return f"$ {math_str} $\n\n"
+        # Drop any $ delimiters already present; unmarked math is wrapped
+        # as display math too
+        math_str = _strip_math_delimiters(section.get("math", section.get("latex", "")))
+        write(f"$ {math_str} $\n\n")
 
     elif stype == "example_problem":
         title = escape_typst(section.get("title", "Example Problem"))
-        prob_stmt = render_mixed_content_typst(section.get("problem_statement", ""))
+        prob_stmt = _render_text(section.get("problem_statement", ""))
         steps = section.get("solution_steps") or []
-        
-        if prob_stmt.lower().startswith("problem statement:"):
+
+        if prob_stmt[:18].lower() == "problem statement:":
             prob_stmt = prob_stmt[18:].strip()
 
         # Using custom Typst `#exampleproblem` function from template
-        typst_out = [
-            f'#exampleproblem(title: "{title}")[',
-            f"  *Problem Statement:* {prob_stmt}",
-            "",
-            "  #solution[",
-        ]
+        write(f'#exampleproblem(title: "{title}")[\n')
+        write(f"  *Problem Statement:* {prob_stmt}\n")
+        write("\n")
+        write("  #solution[\n")
 
         for step in steps:
             for block in step:
                 btype = block.get("type")
                 if btype == "paragraph":
-                    typst_out.append("    " + render_mixed_content_typst(block.get("text", "")))
+                    write("    ")
+                    write(_render_text(block.get("text", "")))
+                    write("\n")
                 elif btype == "equation":
-                    m_str = block.get("math", block.get("latex", "")).strip()
-                    if m_str.startswith("$$") and m_str.endswith("$$"):
-                        m_str = m_str[2:-2].strip()
-                    elif m_str.startswith("$") and m_str.endswith("$"):
-                        m_str = m_str[1:-1].strip()
-                    typst_out.append(f"    $ {m_str} $")
+                    m_str = _strip_math_delimiters(block.get("math", block.get("latex", "")))
+                    write(f"    $ {m_str} $\n")
 
-        typst_out.append("  ]")
-        typst_out.append("]\n")
-        return "\n".join(typst_out)
+        write("  ]\n")
+        write("]\n")
 
     elif stype == "list":
         items = section.get("items") or []
-        typst_out = []
         for item in items:
             item_str = item.get("text", "") if isinstance(item, dict) else str(item)
-            item_text = render_mixed_content_typst(item_str)
-            typst_out.append(f"- {item_text}")
-        typst_out.append("") # Extra newline to close list
-        return "\n".join(typst_out)
+            write("- ")
+            # A figure splits the item into blocks; indenting them under the
+            # marker keeps them inside the item instead of ending the list
+            write(_LIST_CONTINUATION_RE.sub("\n  ", _render_text(item_str)))
+            write("\n")  # The final newline closes the list
 
     return ""
 
 
-def render_page_typst(chapter_structure: Dict[str, Any]) -> str:
+def render_page_typst(chapter_structure: Dict[str, Any], buf: StringIO = None) -> str:
     """
     Renders a full chapter from JSON structure to Typst text.
+
+    With ``buf``, output is written into the shared buffer and ``""`` is
+    returned; otherwise the rendered chapter is returned as a string.
     """
+    if buf is None:
+        buf = StringIO()
+        render_page_typst(chapter_structure, buf)
+        return buf.getvalue()
+
     title = chapter_structure.get("title")
     sections = chapter_structure.get("sections") or []
-    
-    typst_parts = []
+
+    # Parts (title block, then each section) are separated by one newline
+    first = True
 
     # Handle Unit/Chapter titles
     if title:
         title_text = render_mixed_content_typst(title).strip()
         # Case 1: Unit Heading (e.g., "UNIT I")
-        if "UNIT" in title_text.upper():
-            import re
-            m = re.search(r"UNIT\s+([IVXLCDM\d]+)", title_text.upper())
+        title_upper = title_text.upper()
+        if "UNIT" in title_upper:
+            m = _UNIT_RE.search(title_upper)
             if m:
                 u_val = m.group(1)
-                valid_units = ["1", "2", "3", "4", "5", "I", "II", "III", "IV", "V"]
-                if u_val not in valid_units:
+                if u_val not in _VALID_UNITS:
                     print(f"[Renderer] 🚫 Skipping {title_text} (Limit reached)")
                     return ""
-            
+
             # Typst: Use a custom function or plain large heading
-            typst_parts.append(f"#pagebreak()\n#align(center)[#text(size: 24pt, weight: \"bold\")[{title_text}]]\n#v(1cm)\n")
+            buf.write(f"#pagebreak()\n#align(center)[#text(size: 24pt, weight: \"bold\")[{title_text}]]\n#v(1cm)\n")
         else:
             # Case 2: Standard Chapter Title
-            typst_parts.append(f"#pagebreak()\n= {title_text}\n")
+            buf.write(f"#pagebreak()\n= {title_text}\n")
+        first = False
 
     # Render sections
     for section in sections:
-        typst_parts.append(render_section_typst(section))
+        if not first:
+            buf.write("\n")
+        first = False
+        render_section_typst(section, buf)
 
-    return "\n".join(typst_parts)
+    return ""
+
+
+def _render_page_safe(chapter_structure: Dict[str, Any]):
+    """
+    Process-pool entry point: returns ``(typst, None)`` or ``(None, error)``
+    so one bad chapter doesn't abort the whole map.
+    """
+    try:
+        return render_page_typst(chapter_structure), None
+    except Exception as e:
+        return None, str(e)
+
+
+def _render_cache_key(chapter_structure: Dict[str, Any]) -> str:
+    """
+    Content hash of a chapter's canonical JSON plus the renderer source hash.
+    """
+    payload = json.dumps(chapter_structure, sort_keys=True, ensure_ascii=False)
+    digest = hashlib.blake2b(payload.encode("utf-8"), digest_size=16)
+    digest.update(_RENDERER_HASH)
+    return digest.hexdigest()
+
+
+def render_pages_typst(
+    chapters: List[Dict[str, Any]], workers: int = None, cache_dir: Path = None
+):
+    """
+    Renders every chapter across a process pool. Chapters are independent,
+    so results come back in input order as ``(typst, error)`` pairs.
+
+    With ``cache_dir``, rendered chapters are stored as ``{hash}.typ`` and
+    unchanged chapters are read back instead of re-rendered on later runs.
+    """
+    results: List[Any] = [None] * len(chapters)
+    keys: List[str] = []
+    if cache_dir is not None:
+        cache_dir = Path(cache_dir)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        keys = [_render_cache_key(ch) for ch in chapters]
+        for i, key in enumerate(keys):
+            cached = cache_dir / f"{key}.typ"
+            if cached.exists():
+                results[i] = (cached.read_text(encoding="utf-8"), None)
+
+    todo = [i for i, r in enumerate(results) if r is None]
+    pending = [chapters[i] for i in todo]
+    workers = min(workers or os.cpu_count() or 1, len(pending))
+    if workers <= 1:
+        rendered = [_render_page_safe(ch) for ch in pending]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            rendered = list(pool.map(_render_page_safe, pending, chunksize=2))
+
+    for i, result in zip(todo, rendered):
+        results[i] = result
+        if cache_dir is not None and result[1] is None:
+            # Write-then-rename so an interrupted run never leaves a partial entry
+            target = cache_dir / f"{keys[i]}.typ"
+            tmp = target.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_text(result[0], encoding="utf-8")
+            os.replace(tmp, target)
+    return results
 
 
 def sanitize_typst_output(typst_text: str) -> str:
@@ -228,15 +388,6 @@ def sanitize_typst_output(typst_text: str) -> str:
     Post-processing sanitizer for Typst output.
     Cleans up any LLM hallucinations or structural oddities.
     """
-    import re
-    # Strip Unicode that shouldn't be there or causes issues
-    replacements = {
-        "\u00a0": " ",  # Non-breaking space
-        "\u200b": "",   # Zero-width space
-        "```typst": "",
-        "```": "",
-    }
-    for char, rep in replacements.items():
-        typst_text = typst_text.replace(char, rep)
-        
-    return typst_text
+    # Strip Unicode that shouldn't be there or causes issues, then any
+    # leaked ``` / ```typst code fences
+    return typst_text.translate(_SANITIZE_TABLE).replace("```typst", "").replace("```", "")
@@ -17,7 +17,12 @@ from __future__ import annotations
 import os
 import re
 import json
-from io import BytesIO
+import string
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from io import BytesIO, StringIO
 from pathlib import Path
 
 # Try importing google-genai
@@ -45,9 +50,10 @@ except (ImportError, ModuleNotFoundError) as _e:
         print("Warning: litellm not found. Some agent features may be disabled.")
     except UnicodeEncodeError:
         pass
-from dotenv import load_dotenv
+from src import llm_cache
+from src.config import load_env
 
-load_dotenv()
+load_env()
 
 # Project-root-relative paths (work regardless of CWD)
 _BASE_DIR = Path(__file__).resolve().parent.parent
@@ -55,12 +61,73 @@ OUTPUT_DIR = _BASE_DIR / "data" / "output"
 RESOLVED_PATH = OUTPUT_DIR / "resolved_manuscript.md"
 AI_ASSETS_DIR = OUTPUT_DIR / "assets" / "ai_generated"
 
+class _SlugTable(dict):
+    """str.translate table: ASCII letters/digits kept, every other code point → ``_``."""
+
+    def __missing__(self, key: int) -> str:
+        return "_"
+
+
+_SLUG_TABLE = _SlugTable({ord(c): c for c in string.ascii_letters + string.digits})
+
+DESCRIBE_PROMPT = (
+    "Describe this technical diagram in precise detail. "
+    "Include all labels, arrows, flow directions, component names, "
+    "mathematical symbols, dimensions, and spatial relationships. "
+    "Be exhaustive — this description will be used to recreate the image."
+)
+
+REGENERATE_PROMPT = (
+    "Regenerate exactly this professional textbook diagram "
+    "based on this detailed description: {description}"
+)
+
+DEFAULT_ILLUSTRATION_STYLE = (
+    "Flat vector illustration, clean lines, white background, educational textbook graphic"
+)
+
+DIAGRAM_PROMPT = "{subject}. {style}. High quality, technical diagram."
+
+# Cache version follows the prompt texts, so an edited prompt never serves
+# descriptions or enhanced images made with the old one
+_PROMPT_VERSION = llm_cache.prompt_hash(
+    DESCRIBE_PROMPT, REGENERATE_PROMPT, DEFAULT_ILLUSTRATION_STYLE, DIAGRAM_PROMPT
+)
+
+# Bump when the Pillow fallback filter chain changes
+_PILLOW_VERSION = "pil-v2"
+
+# Concurrent image API calls (describe/regenerate/generate are I/O-bound)
+ART_PARALLELISM = int(os.getenv("ART_PARALLELISM", "8"))
+
+# [ORIGINAL_ASSET: <filepath>] tags left by the extractor
+_ASSET_RE = re.compile(r"\[ORIGINAL_ASSET:\s*(.+?)\]")
+
+# Errors worth a model switch / retry: rate limit (429), quota, model not found (404)
+_RETRY_RE = re.compile(r"429|RESOURCE_EXHAUSTED|404|NOT_FOUND|quota")
+
+# Forgiving [NEW_DIAGRAM] matcher, one alternation so the manuscript is scanned once:
+#   1. JSON with or without brackets: [NEW_DIAGRAM: {...}] or NEW_DIAGRAM: {...}
+#   2. Plain text descriptions (no JSON): [NEW_DIAGRAM: Cross-sectional diagram of...]
+_NEW_DIAGRAM_RE = re.compile(
+    r"\[?NEW_DIAGRAM:\s*(\{.*?\})\]?|\[NEW_DIAGRAM:\s*([^\{].*?)\]", re.DOTALL
+)
+
 
 def _get_model() -> str:
     """Return the model identifier from the environment."""
     return os.getenv("DEFAULT_MODEL", "groq/llama3-8b-8192")
 
 
+@lru_cache(maxsize=None)
+def _get_genai_client(api_key: str | None):
+    """
+    One genai Client per key, shared by every art worker thread so their
+    requests reuse the client's pooled keep-alive connections.
+    """
+    return genai.Client(api_key=api_key)
+
+
 # ──────────────────────────────────────────────
 # TASK A: Resolve Original Asset Tags (With AI Enhancement)
 # ──────────────────────────────────────────────
@@ -75,47 +142,50 @@ def enhance_image_with_gemini(image_path: Path) -> Path:
         print("[Art Dept] ⚠️ google-genai not installed. Falling back to Pillow.")
         return _enhance_image_with_pillow(image_path)
 
-    # Define output path
+    # Define output path: content-addressed, so renamed or duplicated
+    # sources share one result and an edited source is re-enhanced
     enhanced_dir = AI_ASSETS_DIR.parent / "enhanced_images"
     enhanced_dir.mkdir(parents=True, exist_ok=True)
 
-    enhanced_path = enhanced_dir / image_path.name
+    image_bytes = image_path.read_bytes()
+    key = _content_key(image_bytes, _PROMPT_VERSION)
+    enhanced_path = enhanced_dir / f"{key}.png"
+    desc_path = enhanced_dir / f"{key}.desc.txt"
     if enhanced_path.exists():
         print(f"  ♻️  Using cached enhanced image: {enhanced_path.name}")
         return enhanced_path
 
     print(f"  🤖 AI Enhancing: {image_path.name}...")
 
-    api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
-    client = genai.Client(api_key=api_key)
+    client = _get_genai_client(
+        os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
+    )
 
     try:
-        # Step 1: Describe the original image using Gemini Vision (bytes for google.genai)
-        prompt = (
-            "Describe this technical diagram in precise detail. "
-            "Include all labels, arrows, flow directions, component names, "
-            "mathematical symbols, dimensions, and spatial relationships. "
-            "Be exhaustive — this description will be used to recreate the image."
-        )
-        image_bytes = image_path.read_bytes()
-        mime = "image/png" if image_path.suffix.lower() == ".png" else "image/jpeg"
-        describe_response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=[
-                types.Content(
-                    parts=[
-                        types.Part.from_bytes(data=image_bytes, mime_type=mime),
-                        types.Part.from_text(text=prompt),
-                    ]
-                )
-            ],
-        )
-        description = describe_response.text
+        if desc_path.exists():
+            # A previous run described this image but failed to regenerate it
+            description = desc_path.read_text(encoding="utf-8")
+        else:
+            # Step 1: Describe the original image using Gemini Vision (bytes for google.genai)
+            mime = "image/png" if image_path.suffix.lower() == ".png" else "image/jpeg"
+            describe_response = client.models.generate_content(
+                model="gemini-2.5-flash",
+                contents=[
+                    types.Content(
+                        parts=[
+                            types.Part.from_bytes(data=image_bytes, mime_type=mime),
+                            types.Part.from_text(text=DESCRIBE_PROMPT),
+                        ]
+                    )
+                ],
+            )
+            description = describe_response.text
+            desc_path.write_text(description, encoding="utf-8")
         print(f"  📝 Description: {description[:100]}...")
 
         # Step 2: Regenerate a cleaner version using the description
         success = generate_textbook_diagram(
-            subject=f"Regenerate exactly this professional textbook diagram based on this detailed description: {description}",
+            subject=REGENERATE_PROMPT.format(description=description),
             theme_config={},
             save_path=enhanced_path,
         )
@@ -128,12 +198,19 @@ def enhance_image_with_gemini(image_path: Path) -> Path:
     except Exception as e:
         print(f"  ⚠️ Gemini enhancement failed: {e}")
         print(f"  ↩️ Falling back to Pillow enhancement...")
-        return _enhance_image_with_pillow(image_path)
+        return _enhance_image_with_pillow(image_path, image_bytes)
 
     return image_path  # Should not reach here
 
 
-def _enhance_image_with_pillow(image_path: Path) -> Path:
+def _content_key(image_bytes: bytes, version: str) -> str:
+    """Hash of the source image bytes plus the pipeline version that made the output."""
+    digest = hashlib.blake2b(image_bytes, digest_size=16)
+    digest.update(version.encode())
+    return digest.hexdigest()
+
+
+def _enhance_image_with_pillow(image_path: Path, image_bytes: bytes = None) -> Path:
     """
     Fallback: Enhance using Pillow (sharpen, contrast, denoise).
     Used when Gemini is unavailable or fails.
@@ -141,9 +218,17 @@ def _enhance_image_with_pillow(image_path: Path) -> Path:
     if not HAS_PILLOW:
         return image_path
 
+    # Content-addressed like the Gemini path: same-named images from
+    # different chapters no longer overwrite each other
     enhanced_dir = AI_ASSETS_DIR.parent / "enhanced_images"
     enhanced_dir.mkdir(parents=True, exist_ok=True)
-    enhanced_path = enhanced_dir / f"pil_{image_path.name}"
+    try:
+        if image_bytes is None:
+            image_bytes = image_path.read_bytes()
+    except OSError:
+        return image_path
+    key = _content_key(image_bytes, _PILLOW_VERSION)
+    enhanced_path = enhanced_dir / f"pil_{key}{image_path.suffix.lower()}"
 
     if enhanced_path.exists():
         return enhanced_path
@@ -153,15 +238,20 @@ def _enhance_image_with_pillow(image_path: Path) -> Path:
         if img.mode not in ("RGB", "L"):
             img = img.convert("RGB")
 
-        img = img.filter(ImageFilter.SHARPEN)
         enhancer = ImageEnhance.Contrast(img)
         img = enhancer.enhance(1.3)
         enhancer = ImageEnhance.Brightness(img)
         img = enhancer.enhance(1.05)
+        # Denoise, then a single 3x3 SHARPEN pass (the pre-denoise one was
+        # largely undone by the median filter)
         img = img.filter(ImageFilter.MedianFilter(size=3))
         img = img.filter(ImageFilter.SHARPEN)
 
-        img.save(enhanced_path, quality=95)
+        # Line art stays lossless; only JPEG sources are re-encoded as JPEG
+        if image_path.suffix.lower() in (".jpg", ".jpeg"):
+            img.save(enhanced_path, quality=95)
+        else:
+            img.save(enhanced_path)
         return enhanced_path
     except Exception:
         return image_path
@@ -173,25 +263,42 @@ def resolve_original_assets(text: str) -> str:
     standard Markdown image syntax, enhancing them with Gemini AI.
     Falls back to Pillow if Gemini is unavailable.
     """
-    pattern = r"\[ORIGINAL_ASSET:\s*(.+?)\]"
-
-    def _replacer(match: re.Match) -> str:
+    matches = list(_ASSET_RE.finditer(text))
+
+    # Enhance each distinct existing asset once, concurrently: every
+    # enhancement is a describe + regenerate round trip to the API.
+    rel_paths = dict.fromkeys(m.group(1).strip() for m in matches)
+    existing = [p for p in rel_paths if (OUTPUT_DIR / "assets" / p).exists()]
+    enhanced: dict[str, Path] = {}
+    if existing:
+        workers = min(ART_PARALLELISM, len(existing))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(
+                enhance_image_with_gemini,
+                [OUTPUT_DIR / "assets" / p for p in existing],
+            )
+            enhanced = dict(zip(existing, results))
+
+    # Splice replacements between the matched spans in one pass
+    buf = StringIO()
+    last = 0
+    for match in matches:
+        buf.write(text[last:match.start()])
+        last = match.end()
         rel_path = match.group(1).strip()
         full_extracted_path = OUTPUT_DIR / "assets" / rel_path
 
-        if full_extracted_path.exists():
+        if rel_path in enhanced:
             # Primary: Gemini AI enhancement (describe → regenerate)
             # Fallback: Pillow enhancement (sharpen/contrast)
-            final_path = enhance_image_with_gemini(full_extracted_path)
-            web_path = str(final_path).replace("\\", "/")
-            return f"![Enhanced Figure]({web_path})"
+            web_path = str(enhanced[rel_path]).replace("\\", "/")
+            buf.write(f"![Enhanced Figure]({web_path})")
         else:
             print(f"[Art Dept] ⚠️ Asset not found: {full_extracted_path}")
             # Empty out the tag so no ugly 'Missing Asset' text appears in the final book
-            return ""
-
-    resolved = re.sub(pattern, _replacer, text)
-    original_count = len(re.findall(pattern, text))
+    buf.write(text[last:])
+    resolved = buf.getvalue()
+    original_count = len(matches)
     print(f"[Art Dept] Resolved & AI-Enhanced {original_count} tags")
     return resolved
 
@@ -209,17 +316,15 @@ def generate_textbook_diagram(
         print("[Art Dept] ⚠️ google-genai not installed. Skipping image generation.")
         return False
 
-    api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
-    client = genai.Client(api_key=api_key)
+    client = _get_genai_client(
+        os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
+    )
 
     # Extract the illustration style generated by Phase 1
-    style_prompt = theme_config.get(
-        "illustration_style",
-        "Flat vector illustration, clean lines, white background, educational textbook graphic",
-    )
+    style_prompt = theme_config.get("illustration_style", DEFAULT_ILLUSTRATION_STYLE)
 
     # Combine the Drafter's subject with the Style Extractor's visual rules
-    full_prompt = f"{subject}. {style_prompt}. High quality, technical diagram."
+    full_prompt = DIAGRAM_PROMPT.format(subject=subject, style=style_prompt)
     print(f'  🎨 Generating: "{subject[:50]}…"')
 
     import time
@@ -303,10 +408,7 @@ def generate_textbook_diagram(
             error_str = str(e)
 
             # Check for Rate Limits (429), Quota Exhaustion, or Model Not Found
-            if any(
-                k in error_str
-                for k in ["429", "RESOURCE_EXHAUSTED", "404", "NOT_FOUND", "quota"]
-            ):
+            if _RETRY_RE.search(error_str):
                 # Switch model if fallbacks are available
                 if fallback_index < len(fallback_models):
                     current_model = fallback_models[fallback_index]
@@ -343,72 +445,79 @@ def resolve_art_tags(text: str, theme_config: dict = None, skip_images: bool = F
     if theme_config is None:
         theme_config = {}
 
-    # Forgiving Regex Suite
-    # 1. Matches nicely formatted JSON with or without brackets: [NEW_DIAGRAM: {...}] or NEW_DIAGRAM: {...}
-    pattern_json_tag = r"\[?NEW_DIAGRAM:\s*(\{.*?\})\]?"
-    # 2. Matches plain text descriptions (no JSON): [NEW_DIAGRAM: Cross-sectional diagram of...]
-    pattern_text_tag = r"\[NEW_DIAGRAM:\s*([^\{].*?)\]"
-
-    matches_json = list(re.finditer(pattern_json_tag, text, re.DOTALL))
-    matches_text = list(re.finditer(pattern_text_tag, text, re.DOTALL))
-
-    total_matches = len(matches_json) + len(matches_text)
+    matches = list(_NEW_DIAGRAM_RE.finditer(text))
+    total_matches = len(matches)
     if total_matches == 0:
         return text
 
     AI_ASSETS_DIR.mkdir(parents=True, exist_ok=True)
-    
+
     from src.placeholder_generator import PlaceholderImageGenerator
     placeholder_gen = PlaceholderImageGenerator()
-
-    _count = [0]
-
-    def generate_and_link(subject: str, caption: str) -> str:
-        _count[0] += 1
-        print(f"   Image {_count[0]}/{total_matches}: Resolving {subject[:30]}...")
-        safe_subject = re.sub(r"[^a-zA-Z0-9]", "_", subject)[:30]
+    placeholder_lock = threading.Lock()
+
+    def parse_tag(match) -> tuple[str, str]:
+        if match.group(1) is not None:
+            # JSON-formatted tag
+            try:
+                art_request = json.loads(match.group(1).replace("\n", " "))
+                subject = art_request.get("subject", "Engineering diagram")
+                caption = art_request.get("caption", " ".join(subject.split()[:5]) + "...")
+                return subject, caption
+            except json.JSONDecodeError:
+                # Fallback: Treat the malformed JSON string as the subject itself
+                return match.group(1).strip(), "Diagram"
+
+        # Plain-text formatted tag
+        subject = match.group(2).strip()
+        return subject, " ".join(subject.split()[:5]) + "..."
+
+    # Pass 1: parse every tag and collect each image file once
+    links = []
+    pending: dict[str, str] = {}  # filename -> subject, in document order
+    for i, match in enumerate(matches, 1):
+        subject, caption = parse_tag(match)
+        print(f"   Image {i}/{total_matches}: Resolving {subject[:30]}...")
+        safe_subject = subject[:30].translate(_SLUG_TABLE)
         filename = f"ai_{safe_subject}.png"
-        save_path = AI_ASSETS_DIR / filename
+        links.append(f"![{caption}](/data/output/assets/ai_generated/{filename})")
+        if filename not in pending and not (AI_ASSETS_DIR / filename).exists():
+            pending[filename] = subject
 
-        if save_path.exists():
-            return f"![{caption}](/data/output/assets/ai_generated/{filename})"
-            
-        if skip_images:
-            placeholder_gen.generate_image(f"Placeholder for: {subject}", str(save_path))
-            return f"![{caption}](/data/output/assets/ai_generated/{filename})"
-
-        success = generate_textbook_diagram(subject, theme_config, save_path)
-        if success:
-            return f"![{caption}](/data/output/assets/ai_generated/{filename})"
-        else:
-            # Generate a distinct placeholder via our new Placeholder generator
-            print(f"  ⚠️ Generated fallback placeholder for {filename}")
-            placeholder_gen.generate_image(f"FAILED TO GENERATE:\n{subject}", str(save_path))
-            return f"![{caption}](/data/output/assets/ai_generated/{filename})"
-
-    # First, replace JSON-formatted tags
-    def replace_json(match):
-        try:
-            art_request = json.loads(match.group(1).replace("\n", " "))
-            subject = art_request.get("subject", "Engineering diagram")
-            caption = art_request.get("caption", " ".join(subject.split()[:5]) + "...")
-            return generate_and_link(subject, caption)
-        except json.JSONDecodeError:
-            # Fallback: Treat the malformed JSON string as the subject itself
-            raw_text = match.group(1).strip()
-            return generate_and_link(raw_text, "Diagram")
-
-    text = re.sub(pattern_json_tag, replace_json, text, flags=re.DOTALL)
-
-    # Second, replace Plain-Text formatted tags
-    def replace_text(match):
-        subject = match.group(1).strip()
-        caption = " ".join(subject.split()[:5]) + "..."
-        return generate_and_link(subject, caption)
-
-    text = re.sub(pattern_text_tag, replace_text, text, flags=re.DOTALL)
+    # Pass 2: produce the missing images. Generation is network-bound, so
+    # independent diagrams run concurrently on a bounded thread pool.
+    if skip_images:
+        placeholder_gen.generate_many(
+            [
+                (f"Placeholder for: {subject}", str(AI_ASSETS_DIR / filename))
+                for filename, subject in pending.items()
+            ]
+        )
+    elif pending:
+
+        def generate(filename: str, subject: str) -> None:
+            save_path = AI_ASSETS_DIR / filename
+            if not generate_textbook_diagram(subject, theme_config, save_path):
+                # Generate a distinct placeholder via our new Placeholder generator
+                print(f"  ⚠️ Generated fallback placeholder for {filename}")
+                with placeholder_lock:
+                    placeholder_gen.generate_image(
+                        f"FAILED TO GENERATE:\n{subject}", str(save_path)
+                    )
 
-    return text
+        workers = min(ART_PARALLELISM, len(pending))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(generate, pending.keys(), pending.values()))
+
+    # Splice links in from the single scan above
+    out = []
+    last = 0
+    for match, link in zip(matches, links):
+        out.append(text[last : match.start()])
+        out.append(link)
+        last = match.end()
+    out.append(text[last:])
+    return "".join(out)
 
 
 # ──────────────────────────────────────────────
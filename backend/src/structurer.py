@@ -9,9 +9,21 @@ import asyncio
 import json
 import litellm
 import os
-from dotenv import load_dotenv
-
-load_dotenv()
+import random
+import re
+from src import jsonio, llm_cache
+from src.config import load_env
+from src.ratelimit import get_bucket
+
+load_env()
+
+# Lone backslashes (LaTeX like \frac, \beta) doubled before parsing
+_BACKSLASH_FIX_RE = re.compile(r'(?<!\\)\\(?![\\"/])')
+# Leading heading numbers such as "1.", "3.2.", "A."
+_HEADING_NUM_RE = re.compile(r"^([A-Z0-9]+\.)+\s*")
+# A letter glued to an inline math delimiter, on either side
+_INLINE_MATH_L_RE = re.compile(r"([a-zA-Z])\$")
+_INLINE_MATH_R_RE = re.compile(r"\$([a-zA-Z])")
 
 # Simplified prompt for prototyping
 SYSTEM_PROMPT = """
@@ -85,6 +97,36 @@ Rules:
 8. **TITLE-CONTENT COHERENCE:** The heading text MUST accurately describe the content that follows it. If 90% of the body text discusses "Heat Exchangers", the heading must NOT say "Diffuser". Always match the heading to the dominant topic of the section below it.
 """
 
+# Cache version follows the prompt text (JSON schema included), so an
+# edited prompt never serves structures made with the old one
+PROMPT_VERSION = llm_cache.prompt_hash(SYSTEM_PROMPT)
+
+
+def clean_json_node(root):
+    """Post-processing to strip explicit heading numbers and fix formatting spaces."""
+    # Explicit stack instead of recursion: no per-node frames, and deeply
+    # nested solution_steps can't hit the recursion limit
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            stype = node.get("type")
+            if stype == "heading" and "text" in node:
+                text = node.get("text")
+                if text:
+                    # Strip things like "1.", "3.2.", "A." from the start
+                    node["text"] = _HEADING_NUM_RE.sub("", str(text)).strip()
+            elif stype == "paragraph" and "text" in node:
+                text = node.get("text")
+                if text:
+                    # Ensure spaces around inline math to fix TOC missing space bugs
+                    text = _INLINE_MATH_L_RE.sub(r"\1 $", str(text))
+                    node["text"] = _INLINE_MATH_R_RE.sub(r"$ \1", text)
+
+            stack.extend(v for v in node.values() if isinstance(v, (dict, list)))
+        elif isinstance(node, list):
+            stack.extend(v for v in node if isinstance(v, (dict, list)))
+
 
 async def structurer_node(text_chunk: str) -> dict:
     """Convert text chunk to structured JSON. Returns dict with error key on failure."""
@@ -109,6 +151,13 @@ async def structurer_node(text_chunk: str) -> dict:
         )
         text_chunk = text_chunk[:max_chunk_size] + "\n\n[... truncated ...]"
 
+    # Same prompt + model + chunk → same structure: reuse it from disk
+    cache_key = llm_cache.make_key(PROMPT_VERSION, model, text_chunk)
+    cached = llm_cache.get("structurer", cache_key)
+    if cached is not None:
+        clean_json_node(cached)
+        return cached
+
     max_retries = 3
     base_delay = 2
 
@@ -119,6 +168,7 @@ async def structurer_node(text_chunk: str) -> dict:
                 print("[Structurer] ❌ No API key for Gemini model")
                 return {"error": "Missing GOOGLE_API_KEY"}
 
+            await get_bucket(model).acquire()
             response = await litellm.acompletion(
                 model=model,
                 timeout=300,  # 5 minutes timeout
@@ -130,12 +180,26 @@ async def structurer_node(text_chunk: str) -> dict:
                 # A3: Force JSON-guaranteed output at the API level
                 # Prevents all trailing-comma and missing-bracket crashes
                 response_format={"type": "json_object"},
+                # Stream the long JSON body: bytes flow from the first token,
+                # so slow generations don't sit on an idle connection
+                stream=True,
                 api_key=api_key if model.startswith("gemini/") else None,
                 api_base=os.getenv("OLLAMA_API_BASE") if provider == "ollama" else None,
             )
 
+            # Accumulate streamed deltas into the full response text
+            parts = []
+            got_choices = False
+            async for chunk in response:
+                if not getattr(chunk, "choices", None):
+                    continue
+                got_choices = True
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+
             # Validate response
-            if not response or not hasattr(response, "choices") or not response.choices:
+            if not got_choices:
                 print(
                     f"[Structurer] ⚠️ Empty response (Attempt {attempt+1}/{max_retries})"
                 )
@@ -144,7 +208,7 @@ async def structurer_node(text_chunk: str) -> dict:
                     continue
                 return {"error": "Empty response from LLM"}
 
-            content = response.choices[0].message.content
+            content = "".join(parts)
             if not content:
                 print(
                     f"[Structurer] ⚠️ Empty content (Attempt {attempt+1}/{max_retries})"
@@ -156,8 +220,6 @@ async def structurer_node(text_chunk: str) -> dict:
 
             # Try to parse JSON
             try:
-                import re
-
                 # Clean up common JSON issues
                 content = content.strip()
                 # Remove markdown code fences if present
@@ -171,9 +233,12 @@ async def structurer_node(text_chunk: str) -> dict:
                 
                 # Replace single backslashes in JSON output with double backslashes
                 # to prevent parse errors from LLM escaping output bugs
-                content = re.sub(r'(?<!\\)\\(?![\\"/])', r"\\\\", content)
+                # Not skipped when the text already parses: JSON would read a
+                # bare \frac as a form feed followed by "rac"
+                if "\\" in content:
+                    content = _BACKSLASH_FIX_RE.sub(r"\\\\", content)
 
-                parsed = json.loads(content)
+                parsed = jsonio.loads(content)
 
                 # Basic schema validation (O4)
                 if isinstance(parsed, dict):
@@ -185,33 +250,12 @@ async def structurer_node(text_chunk: str) -> dict:
                             await asyncio.sleep(base_delay * (attempt + 1))
                             continue
 
-                # Post-processing to strip explicit heading numbers and fix formatting spaces
-                def clean_json_node(node):
-                    if isinstance(node, dict):
-                        if node.get("type") == "heading" and "text" in node:
-                            text = node.get("text")
-                            if text:
-                                # Strip things like "1.", "3.2.", "A." from the start
-                                node["text"] = re.sub(
-                                    r"^([A-Z0-9]+\.)+\s*", "", str(text)
-                                ).strip()
-                        elif node.get("type") == "paragraph" and "text" in node:
-                            text = node.get("text")
-                            if text:
-                                # Ensure spaces around inline math to fix TOC missing space bugs
-                                node["text"] = re.sub(
-                                    r"([a-zA-Z])\$", r"\1 $", str(text)
-                                )
-                                node["text"] = re.sub(
-                                    r"\$([a-zA-Z])", r"$ \1", node["text"]
-                                )
-
-                        for v in node.values():
-                            clean_json_node(v)
-                    elif isinstance(node, list):
-                        for item in node:
-                            clean_json_node(item)
-
+                # Cache the raw structure; cleaning is re-applied on every hit
+                if isinstance(parsed, dict) and ("sections" in parsed or "type" in parsed):
+                    llm_cache.put(
+                        "structurer", cache_key, parsed,
+                        model=model, prompt_version=PROMPT_VERSION,
+                    )
                 clean_json_node(parsed)
 
                 return parsed
@@ -243,7 +287,9 @@ async def structurer_node(text_chunk: str) -> dict:
                 if attempt < max_retries - 1:
                     delay = base_delay * (2**attempt) * 5  # 10s, 20s, 40s
                     print(f"   ⏳ Rate limit hit, waiting {delay}s before retry...")
-                    await asyncio.sleep(delay)
+                    # Pause the whole provider: the retry and every other
+                    # in-flight chunk wait in acquire() instead of re-hitting 429
+                    get_bucket(model).cooldown(delay + random.uniform(0, 1))
                     continue
                 else:
                     return {"error": f"Rate limit exceeded after {max_retries} retries"}
@@ -266,6 +312,33 @@ async def structurer_node(text_chunk: str) -> dict:
     return {"error": f"Failed after {max_retries} retries"}
 
 
+async def structure_chunks(chunks, concurrency: int = 8, on_result=None) -> list:
+    """
+    Structure many chunks with at most ``concurrency`` calls in flight.
+
+    A fixed pool of workers pulls from one shared iterator, so only
+    ``concurrency`` coroutines exist however long the chunk list is; the
+    provider RPM is enforced by the shared bucket in structurer_node.
+    Results come back in input order. ``on_result(i, data)`` is awaited as
+    each chunk finishes (e.g. for checkpointing).
+    """
+    results = [None] * len(chunks)
+    pending = iter(enumerate(chunks))
+
+    async def _worker():
+        for i, chunk in pending:
+            try:
+                data = await structurer_node(chunk)
+            except Exception as e:
+                data = {"error": str(e)}
+            results[i] = data
+            if on_result is not None:
+                await on_result(i, data)
+
+    await asyncio.gather(*(_worker() for _ in range(min(concurrency, len(chunks)))))
+    return results
+
+
 if __name__ == "__main__":
     # Test with a snippet relevant to "Page 6" / Example Problems
     test_chunk = r"""
@@ -284,4 +357,4 @@ if __name__ == "__main__":
     """
 
     result = structurer_node(test_chunk)
-    print(json.dumps(result, indent=2))
+    print(jsonio.dumps(result))
@@ -28,6 +28,9 @@ import fitz  # PyMuPDF
 # Project-root-relative paths (optional; style output can be in memory only)
 _BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Longest side (px) of the page image sent for style analysis
+STYLE_MAX_PX = 1024
+
 
 def extract_style(guide_path: str) -> dict:
     """
@@ -63,9 +66,14 @@ def extract_style(guide_path: str) -> dict:
         if len(doc) < 1:
             return {}
 
+        # Render so the long side lands near STYLE_MAX_PX (Gemini downscales
+        # anything larger anyway) and ship JPEG: no PNG deflate, fewer bytes
         page = doc[0]
-        pix = page.get_pixmap()
-        img_data = pix.tobytes("png")
+        zoom = STYLE_MAX_PX / max(page.rect.width, page.rect.height)
+        zoom = min(max(zoom, 1.0), 2.0)
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+        img_data = pix.tobytes("jpeg", jpg_quality=85)
+        doc.close()
 
         # 2. Call Gemini for visual analysis
         client = genai.Client(
@@ -93,7 +101,7 @@ def extract_style(guide_path: str) -> dict:
                     role="user",
                     parts=[
                         types.Part.from_text(text=prompt),
-                        types.Part.from_bytes(data=img_data, mime_type="image/png"),
+                        types.Part.from_bytes(data=img_data, mime_type="image/jpeg"),
                     ],
                 )
             ],
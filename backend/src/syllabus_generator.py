@@ -7,13 +7,15 @@ Reads the complete extracted manuscript and generates a strict
 
 import os
 import json
-import time
+import asyncio
 from pathlib import Path
 
 import litellm
-from dotenv import load_dotenv
+from src import jsonio, llm_cache
+from src.ratelimit import backoff_delay, get_bucket
+from src.config import load_env
 
-load_dotenv()
+load_env()
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 OUTPUT_DIR = BASE_DIR / "data" / "output"
@@ -52,12 +54,16 @@ JSON Schema:
 }
 """
 
+# Cache version follows the prompt text, so an edited prompt never
+# serves a syllabus made with the old one
+PROMPT_VERSION = llm_cache.prompt_hash(SYSTEM_PROMPT)
+
 
 def _get_model() -> str:
     return os.getenv("DEFAULT_MODEL", "groq/llama3-8b-8192")
 
 
-def generate_syllabus(manuscript_path: str | Path) -> dict | None:
+async def agenerate_syllabus(manuscript_path: str | Path) -> dict | None:
     """Generate the syllabus from the manuscript text and save to JSON."""
     model = _get_model()
     api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
@@ -81,6 +87,19 @@ def generate_syllabus(manuscript_path: str | Path) -> dict | None:
 
     print(f"\n   🎓 Generating {academic_level} Syllabus for {book_subject}...")
 
+    # Unchanged manuscript + subject + level → reuse the stored syllabus
+    cache_key = llm_cache.make_key(
+        PROMPT_VERSION, model, book_subject, academic_level, text
+    )
+    syllabus_data = llm_cache.get("syllabus", cache_key)
+    if syllabus_data is not None:
+        OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+        SYLLABUS_PATH.write_text(
+            jsonio.dumps(syllabus_data), encoding="utf-8"
+        )
+        print(f"   ✅ Syllabus loaded from cache and saved to {SYLLABUS_PATH.name}")
+        return syllabus_data
+
     max_retries = 3
     for attempt in range(max_retries):
         try:
@@ -88,7 +107,8 @@ def generate_syllabus(manuscript_path: str | Path) -> dict | None:
                 print("   ❌ Gemini API key missing for Syllabus Generator.")
                 return None
 
-            response = litellm.completion(
+            await get_bucket(model).acquire()
+            response = await litellm.acompletion(
                 model=model,
                 timeout=LLM_TIMEOUT,
                 messages=[
@@ -112,12 +132,16 @@ def generate_syllabus(manuscript_path: str | Path) -> dict | None:
                 content = content[:-3]
             content = content.strip()
 
-            syllabus_data = json.loads(content)
+            syllabus_data = jsonio.loads(content)
+            llm_cache.put(
+                "syllabus", cache_key, syllabus_data,
+                model=model, prompt_version=PROMPT_VERSION,
+            )
 
             # Save to disk
             OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
             SYLLABUS_PATH.write_text(
-                json.dumps(syllabus_data, indent=2), encoding="utf-8"
+                jsonio.dumps(syllabus_data), encoding="utf-8"
             )
 
             print(f"   ✅ Syllabus generated and saved to {SYLLABUS_PATH.name}")
@@ -126,15 +150,23 @@ def generate_syllabus(manuscript_path: str | Path) -> dict | None:
         except json.JSONDecodeError as e:
             print(f"   ⚠️ JSON parse error on attempt {attempt+1}: {e}")
             if attempt < max_retries - 1:
-                time.sleep(2)
+                await asyncio.sleep(2)
         except Exception as e:
             print(f"   ⚠️ Syllabus generation failed: {e}")
-            if attempt < max_retries - 1:
-                time.sleep(2)
+            if isinstance(e, litellm.RateLimitError) or "429" in str(e):
+                # The next attempt waits out the provider-wide cooldown in acquire()
+                get_bucket(model).cooldown(backoff_delay(attempt))
+            elif attempt < max_retries - 1:
+                await asyncio.sleep(2)
 
     print("   ❌ Failed to generate Syllabus after 3 attempts.")
     return None
 
 
+def generate_syllabus(manuscript_path: str | Path) -> dict | None:
+    """Synchronous entry point for :func:`agenerate_syllabus`."""
+    return asyncio.run(agenerate_syllabus(manuscript_path))
+
+
 if __name__ == "__main__":
     generate_syllabus(OUTPUT_DIR / "tagged_manuscript.txt")
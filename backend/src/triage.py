@@ -10,16 +10,36 @@ from __future__ import annotations
 import os
 import re
 import json
-import time
+import asyncio
+import hashlib
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
 from pathlib import Path
 
-from PIL import Image
+from PIL import Image, ImageDraw, ImageFont
+from src import jsonio, llm_cache
+from src.ratelimit import get_bucket
 
 # Project-root-relative paths (work regardless of CWD)
 _BASE_DIR = Path(__file__).resolve().parent.parent
 OUTPUT_DIR = _BASE_DIR / "data" / "output"
 DEFAULT_CACHE_DIR = str(OUTPUT_DIR / "assets" / "extracted_images")
 TRANSCRIBED_MATH_PATH = OUTPUT_DIR / "transcribed_math.json"
+# Append-only journal of {filename: latex} lines, folded into the .json at the end
+TRANSCRIBED_JOURNAL_PATH = TRANSCRIBED_MATH_PATH.with_suffix(".jsonl")
+
+# Images triaged concurrently (Gemini RPM is enforced by src.ratelimit)
+TRIAGE_CONCURRENCY = int(os.getenv("TRIAGE_CONCURRENCY", "8"))
+# Threads for the local size filter + dedup hashing pre-scan
+SCAN_WORKERS = 8
+# Small images (longest side <= COLLAGE_TILE_PX) are triaged nine per request;
+# only KEEP is taken from a collage, deletions are confirmed per image
+TRIAGE_COLLAGE = os.getenv("TRIAGE_COLLAGE", "true").lower() != "false"
+COLLAGE_TILE_PX = 512
+
+# [ORIGINAL_ASSET: <path>] tags in the tagged manuscript
+_ASSET_TAG_RE = re.compile(r"\[ORIGINAL_ASSET:\s*([^\]]+)\]")
 
 # Optional: use google.genai for vision triage
 try:
@@ -50,6 +70,61 @@ OCR_PROMPT = """Extract the mathematical equations or table from this image.
 Output ONLY valid LaTeX code. For math, wrap in \\[ and \\]. Do not include ```latex wrappers or any conversational text."""
 
 
+COLLAGE_PROMPT = """You are the Art Director for a professional Engineering Textbook.
+The provided image is a grid of SEPARATE images extracted from a raw PDF. Each tile
+is labeled with a letter ({LABELS}) in the bar above it. Classify EACH tile
+independently and strictly as KEEP, DISCARD, or TRANSCRIBE.
+
+Rules for KEEP:
+- It is a technical diagram, schematic, circuit (e.g., pumps, valves), graph, or free-body diagram.
+
+Rules for DISCARD:
+- It is a university logo, company logo, decorative border, or tiny illegible artifact.
+
+Rules for TRANSCRIBE:
+- The image is purely a mathematical equation, formula, or data table trapped as a picture.
+
+Output ONLY a raw JSON object with no markdown wrappers, one key per tile label:
+{"A": {"decision": "KEEP|DISCARD|TRANSCRIBE", "reason": "brief explanation"}, "B": {...}}
+"""
+
+# Cache version follows the prompt texts, so an edited prompt never serves
+# decisions or transcriptions made with the old one
+PROMPT_VERSION = llm_cache.prompt_hash(TRIAGE_PROMPT, OCR_PROMPT, COLLAGE_PROMPT)
+
+_TILE_LABELS = "ABCDEFGHI"  # 3x3 collage
+
+
+def _strip_json_fences(text: str) -> str:
+    return text.strip().replace("```json", "").replace("```", "")
+
+
+def _build_collage(images: list[bytes]) -> bytes:
+    """
+    Paste up to nine small images into a labeled 3x3 grid (PNG bytes).
+    Each tile gets a white label bar above it so the model can refer to it.
+    """
+    tile, bar, grid = COLLAGE_TILE_PX, 48, 3
+    rows = -(-len(images) // grid)
+    canvas = Image.new("RGB", (tile * grid, (tile + bar) * rows), "white")
+    draw = ImageDraw.Draw(canvas)
+    try:
+        font = ImageFont.load_default(size=36)
+    except TypeError:  # Pillow < 10.1: fixed-size bitmap font
+        font = ImageFont.load_default()
+    for n, data in enumerate(images):
+        x, y = (n % grid) * tile, (n // grid) * (tile + bar)
+        with Image.open(BytesIO(data)) as img:
+            img = img.convert("RGB")
+            img.thumbnail((tile, tile))
+            canvas.paste(img, (x + (tile - img.width) // 2, y + bar + (tile - img.height) // 2))
+        draw.text((x + 8, y + 4), _TILE_LABELS[n], fill="black", font=font)
+        draw.rectangle([x, y, x + tile - 1, y + tile + bar - 1], outline="black", width=2)
+    buf = BytesIO()
+    canvas.save(buf, format="PNG", compress_level=1)
+    return buf.getvalue()
+
+
 def _get_vision_client():
     """Return a configured genai Client if API key is set."""
     if not HAS_GENAI:
@@ -60,15 +135,58 @@ def _get_vision_client():
     return genai.Client(api_key=api_key)
 
 
-def _generate_content_with_image(
-    client, model: str, prompt: str, image_path: str
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# JPEG start-of-frame markers (all except DHT C4, JPG C8 and DAC CC)
+_JPEG_SOF = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def _fast_dims(data: bytes) -> tuple[int, int] | None:
+    """
+    Read ``(width, height)`` straight from a PNG IHDR or JPEG SOFn header.
+    Returns None for anything else so the caller can fall back to PIL.
+    """
+    if data[:8] == _PNG_SIGNATURE and data[12:16] == b"IHDR":
+        return struct.unpack(">II", data[16:24])
+    if data[:2] != b"\xff\xd8":
+        return None
+    i, end = 2, len(data)
+    while i + 9 <= end:
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:  # Fill byte
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD9:  # No length field
+            i += 2
+            continue
+        if marker in _JPEG_SOF:
+            height, width = struct.unpack(">HH", data[i + 5 : i + 9])
+            return width, height
+        i += 2 + struct.unpack(">H", data[i + 2 : i + 4])[0]
+    return None
+
+
+def _scan_image(filepath: str) -> tuple[str, int, int] | Exception:
+    """Return ``(sha256, width, height)`` of one image, or the error raised."""
+    try:
+        data = Path(filepath).read_bytes()
+        # Byte math on the header already in memory; PIL only for exotic files
+        dims = _fast_dims(data)
+        if dims is None:
+            with Image.open(filepath) as img:  # Header only: no pixel decode
+                dims = img.size
+        width, height = dims
+        digest = hashlib.sha256(data).hexdigest()
+        return digest, width, height
+    except Exception as e:
+        return e
+
+
+async def _agenerate_content_with_image(
+    client, model: str, prompt: str, image_bytes: bytes, mime: str
 ) -> str:
-    """Call Gemini Vision with one image. Returns response text."""
-    with open(image_path, "rb") as f:
-        image_bytes = f.read()
-    # Determine mime type from extension
-    ext = Path(image_path).suffix.lower()
-    mime = "image/png" if ext == ".png" else "image/jpeg"
+    """Call Gemini Vision with one image on the async client. Returns response text."""
     contents = [
         types.Content(
             parts=[
@@ -77,11 +195,15 @@ def _generate_content_with_image(
             ]
         )
     ]
-    response = client.models.generate_content(model=model, contents=contents)
+    # Pre-throttle against the shared Gemini RPM budget instead of a fixed sleep
+    await get_bucket(f"gemini/{model}").acquire()
+    response = await client.aio.models.generate_content(model=model, contents=contents)
     return response.text if hasattr(response, "text") and response.text else ""
 
 
-def process_images(cache_dir: str | None = None) -> list[str]:
+async def aprocess_images(
+    cache_dir: str | None = None, concurrency: int | None = None
+) -> list[str]:
     """Scans extracted images, filters garbage, and OCRs trapped math."""
     cache_dir = cache_dir or DEFAULT_CACHE_DIR
     if not os.path.exists(cache_dir):
@@ -91,12 +213,21 @@ def process_images(cache_dir: str | None = None) -> list[str]:
     transcribed_assets = {}
     if os.path.exists(TRANSCRIBED_MATH_PATH):
         try:
-            transcribed_assets = json.loads(
-                TRANSCRIBED_MATH_PATH.read_text(encoding="utf-8")
-            )
+            transcribed_assets = jsonio.loads(TRANSCRIBED_MATH_PATH.read_bytes())
             print(f"📂 Loaded {len(transcribed_assets)} existing transcriptions.")
         except (json.JSONDecodeError, FileNotFoundError):
             pass
+    # Replay transcriptions journaled by an interrupted run
+    if os.path.exists(TRANSCRIBED_JOURNAL_PATH):
+        replayed = 0
+        for line in TRANSCRIBED_JOURNAL_PATH.read_bytes().splitlines():
+            try:
+                transcribed_assets.update(jsonio.loads(line))
+                replayed += 1
+            except (json.JSONDecodeError, TypeError, ValueError):
+                continue  # Torn last line from a crash mid-write
+        if replayed:
+            print(f"📂 Replayed {replayed} journaled transcriptions.")
 
     discarded_images = []
     client = _get_vision_client()
@@ -104,122 +235,256 @@ def process_images(cache_dir: str | None = None) -> list[str]:
 
     print("🔍 Starting Visual Triage Agent...")
 
-    all_files = [
-        f
-        for f in os.listdir(cache_dir)
-        if f.lower().endswith((".png", ".jpg", ".jpeg"))
-    ]
-    total_images = len(all_files)
+    # scandir entries carry the stat from the directory read; largest files
+    # first so the most informative diagrams are triaged early if interrupted
+    with os.scandir(cache_dir) as it:
+        entries = [
+            e
+            for e in it
+            if e.name.lower().endswith((".png", ".jpg", ".jpeg")) and e.is_file()
+        ]
+    entries.sort(key=lambda e: e.stat().st_size, reverse=True)
+    all_files = [e.name for e in entries]
+
+    # 1. Hardware Filter + byte-exact dedup. Header reads and hashing overlap
+    # across a thread pool; tiny artifacts never reach the API, and repeated
+    # logos/icons are triaged once per distinct image.
+    with ThreadPoolExecutor(max_workers=SCAN_WORKERS) as pool:
+        scans = list(
+            pool.map(_scan_image, [e.path for e in entries])
+        )
 
-    for i, filename in enumerate(all_files):
-        print(f"[Triage] Processing Image {i+1}/{total_images}")
-        time.sleep(2.0)
+    groups: dict[str, list[str]] = {}
+    dims: dict[str, tuple[int, int]] = {}
+    for filename, scan in zip(all_files, scans):
+        if isinstance(scan, Exception):
+            print(f"⚠️ Error analyzing {filename}: {scan}. Defaulting to KEEP.")
+            continue
+        digest, width, height = scan
+        if width < 80 or height < 80:
+            print(f"🗑️ DISCARD: {filename} (Artifact too small)")
+            try:
+                os.remove(os.path.join(cache_dir, filename))
+                discarded_images.append(filename)
+            except OSError as e:
+                print(f"⚠️ Error analyzing {filename}: {e}. Defaulting to KEEP.")
+            continue
+        groups.setdefault(digest, []).append(filename)
+        dims[filename] = (width, height)
+
+    unique = list(groups.values())
+    total_images = len(unique)
+    duplicates = sum(len(g) - 1 for g in unique)
+    if duplicates:
+        print(f"🔁 {duplicates} duplicate image(s) share a decision with an identical image")
+
+    async def _load(filename: str) -> tuple[bytes, str, str]:
         filepath = os.path.join(cache_dir, filename)
-
+        image_bytes = await asyncio.to_thread(Path(filepath).read_bytes)
+        # Determine mime type from extension
+        ext = Path(filepath).suffix.lower()
+        mime = "image/png" if ext == ".png" else "image/jpeg"
+        # Identical image bytes get the same decision on re-runs
+        cache_key = llm_cache.make_key(PROMPT_VERSION, model, image_bytes)
+        return image_bytes, mime, cache_key
+
+    async def _classify(filename: str, image_bytes: bytes, mime: str, cache_key: str) -> dict:
+        # 2. Vision API Triage of one image
         try:
-            img = Image.open(filepath)
-
-            # 1. Hardware Filter: Delete tiny artifacts without wasting API tokens
-            if img.width < 80 or img.height < 80:
-                print(f"🗑️ DISCARD: {filename} (Artifact too small)")
-                img.close()
-                os.remove(filepath)
-                discarded_images.append(filename)
-                continue
-
-            # 2. Vision API Triage (or default KEEP if no API)
+            result = llm_cache.get("triage", cache_key)
+            if result is None:
+                result_text = await _agenerate_content_with_image(
+                    client, model, TRIAGE_PROMPT, image_bytes, mime
+                )
+                result = jsonio.loads(_strip_json_fences(result_text))
+                llm_cache.put(
+                    "triage", cache_key, result,
+                    model=model, prompt_version=PROMPT_VERSION,
+                )
+        except (json.JSONDecodeError, Exception) as e:
+            print(f"⚠️ Triage API error for {filename}: {e}. Defaulting to KEEP.")
+            result = {"decision": "KEEP", "reason": "API error"}
+        return result
+
+    async def _apply(filenames: list[str], result: dict, loaded) -> None:
+        filename = filenames[0]
+        decision = result.get("decision", "KEEP")
+
+        if decision == "DISCARD":
+            for name in filenames:
+                print(f"🗑️ DISCARD: {name} - {result.get('reason')}")
+                os.remove(os.path.join(cache_dir, name))
+                discarded_images.append(name)
+
+        elif decision == "TRANSCRIBE":
+            print(f"🧮 TRANSCRIBE: Rescuing math from {filename}...")
             if client:
+                image_bytes, mime, cache_key = loaded
                 try:
-                    result_text = _generate_content_with_image(
-                        client, model, TRIAGE_PROMPT, filepath
-                    )
-                    result_text = (
-                        result_text.strip().replace("```json", "").replace("```", "")
-                    )
-                    result = json.loads(result_text)
-                except (json.JSONDecodeError, Exception) as e:
-                    print(
-                        f"⚠️ Triage API error for {filename}: {e}. Defaulting to KEEP."
-                    )
-                    result = {"decision": "KEEP", "reason": "API error"}
-            else:
-                result = {"decision": "KEEP", "reason": "No GEMINI_API_KEY"}
-
-            decision = result.get("decision", "KEEP")
-
-            if decision == "DISCARD":
-                print(f"🗑️ DISCARD: {filename} - {result.get('reason')}")
-                img.close()
-                os.remove(filepath)
-                discarded_images.append(filename)
-
-            elif decision == "TRANSCRIBE":
-                print(f"🧮 TRANSCRIBE: Rescuing math from {filename}...")
-                if client:
-                    try:
-                        extracted_latex = _generate_content_with_image(
-                            client, model, OCR_PROMPT, filepath
+                    extracted_latex = llm_cache.get("ocr", cache_key)
+                    if extracted_latex is None:
+                        extracted_latex = await _agenerate_content_with_image(
+                            client, model, OCR_PROMPT, image_bytes, mime
                         )
                         extracted_latex = extracted_latex.strip()
-                    except Exception as e:
-                        print(f"⚠️ OCR failed for {filename}: {e}")
-                        extracted_latex = ""
-                else:
+                        llm_cache.put(
+                            "ocr", cache_key, extracted_latex,
+                            model=model, prompt_version=PROMPT_VERSION,
+                        )
+                except Exception as e:
+                    print(f"⚠️ OCR failed for {filename}: {e}")
                     extracted_latex = ""
-                transcribed_assets[filename] = extracted_latex
-                img.close()
-                os.remove(filepath)
-                discarded_images.append(filename)
-
-                # Incremental Save (Fault Tolerance for Resumes)
-                OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-                TRANSCRIBED_MATH_PATH.write_text(
-                    json.dumps(transcribed_assets, indent=4), encoding="utf-8"
-                )
-
             else:
-                print(f"✅ KEEP: {filename} - {result.get('reason')}")
-                img.close()
-
+                extracted_latex = ""
+            # Incremental Save (Fault Tolerance for Resumes): one journal
+            # line per image instead of rewriting the whole dict
+            for name in filenames:
+                transcribed_assets[name] = extracted_latex
+                journal.write(jsonio.dumps_line({name: extracted_latex}))
+            journal.flush()
+            for name in filenames:
+                os.remove(os.path.join(cache_dir, name))
+                discarded_images.append(name)
+
+        else:
+            for name in filenames:
+                print(f"✅ KEEP: {name} - {result.get('reason')}")
+
+    async def _triage_one(i: int, filenames: list[str]) -> None:
+        print(f"[Triage] Processing Image {i+1}/{total_images}")
+        filename = filenames[0]
+        try:
+            # Vision API Triage (or default KEEP if no API)
+            if client:
+                loaded = await _load(filename)
+                result = await _classify(filename, *loaded)
+            else:
+                loaded = None
+                result = {"decision": "KEEP", "reason": "No GEMINI_API_KEY"}
+            await _apply(filenames, result, loaded)
         except Exception as e:
             print(f"⚠️ Error analyzing {filename}: {e}. Defaulting to KEEP.")
 
+    async def _triage_batch(batch: list[tuple[int, list[str]]]) -> None:
+        # Small images share one collage request; cached tiles are skipped
+        # and any tile the collage answer misses falls back to a solo call.
+        # The collage can only KEEP: a DISCARD/TRANSCRIBE verdict deletes the
+        # file, so it is re-checked on the image alone before it is applied
+        loaded, results = {}, {}
+        for i, filenames in batch:
+            print(f"[Triage] Processing Image {i+1}/{total_images} (collage)")
+            try:
+                loaded[i] = await _load(filenames[0])
+                results[i] = llm_cache.get("triage", loaded[i][2])
+            except Exception as e:
+                print(f"⚠️ Error analyzing {filenames[0]}: {e}. Defaulting to KEEP.")
+
+        misses = [i for i in loaded if results.get(i) is None]
+        if len(misses) > 1:
+            try:
+                collage = await asyncio.to_thread(
+                    _build_collage, [loaded[i][0] for i in misses]
+                )
+                labels = _TILE_LABELS[: len(misses)]
+                result_text = await _agenerate_content_with_image(
+                    client, model,
+                    COLLAGE_PROMPT.replace("{LABELS}", ", ".join(labels)),
+                    collage, "image/png",
+                )
+                answers = jsonio.loads(_strip_json_fences(result_text))
+                for label, i in zip(labels, misses):
+                    tile = answers.get(label) if isinstance(answers, dict) else None
+                    if isinstance(tile, dict) and tile.get("decision") == "KEEP":
+                        results[i] = tile
+                        llm_cache.put(
+                            "triage", loaded[i][2], tile,
+                            model=model, prompt_version=PROMPT_VERSION,
+                        )
+            except Exception as e:
+                print(f"⚠️ Collage triage failed: {e}. Falling back to single images.")
+
+        for i, filenames in batch:
+            if i not in loaded:
+                continue
+            try:
+                result = results.get(i)
+                if result is None:
+                    result = await _classify(filenames[0], *loaded[i])
+                await _apply(filenames, result, loaded[i])
+            except Exception as e:
+                print(f"⚠️ Error analyzing {filenames[0]}: {e}. Defaulting to KEEP.")
+
+    # Images are independent: triage them concurrently, bounded by a semaphore.
+    # With an API client, small images are batched into collages.
+    jobs = []
+    small = []
+    for i, filenames in enumerate(unique):
+        width, height = dims[filenames[0]]
+        if client and TRIAGE_COLLAGE and max(width, height) <= COLLAGE_TILE_PX:
+            small.append((i, filenames))
+        else:
+            jobs.append((_triage_one, i, filenames))
+    for n in range(0, len(small), len(_TILE_LABELS)):
+        batch = small[n : n + len(_TILE_LABELS)]
+        if len(batch) == 1:
+            jobs.append((_triage_one, *batch[0]))
+        else:
+            jobs.append((_triage_batch, batch))
+
+    sem = asyncio.Semaphore(concurrency or TRIAGE_CONCURRENCY)
+
+    async def _bounded(fn, *args) -> None:
+        async with sem:
+            await fn(*args)
+
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    with open(TRANSCRIBED_JOURNAL_PATH, "ab") as journal:
+        await asyncio.gather(*(_bounded(*job) for job in jobs))
+
     # 3. Save Transcribed Math so the Drafter can inject it later
     if transcribed_assets:
-        OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
         # Always update the file count
         TRANSCRIBED_MATH_PATH.write_text(
-            json.dumps(transcribed_assets, indent=4), encoding="utf-8"
+            jsonio.dumps(transcribed_assets), encoding="utf-8"
         )
         print(f"💾 Total transcribed equations in database: {len(transcribed_assets)}")
+    # Everything journaled is now in the .json
+    TRANSCRIBED_JOURNAL_PATH.unlink(missing_ok=True)
 
     return discarded_images
 
 
+def process_images(
+    cache_dir: str | None = None, concurrency: int | None = None
+) -> list[str]:
+    """Synchronous entry point for :func:`aprocess_images`."""
+    return asyncio.run(aprocess_images(cache_dir, concurrency))
+
+
 def clean_manuscript(manuscript_path: str | Path, discarded_images: list[str]) -> None:
     """Removes [ORIGINAL_ASSET] tags for images that were deleted or transcribed."""
     manuscript_path = Path(manuscript_path)
     try:
         content = manuscript_path.read_text(encoding="utf-8")
-        
-        # Strip explicitly discarded images
+
+        # One pass over the manuscript: a tag goes if its file was explicitly
+        # discarded, or (robust fallback, critical for crash resumes) if the
+        # file no longer exists
+        discarded_set = {os.path.basename(name) for name in discarded_images}
         removed_count = 0
-        for filename in discarded_images:
-            pattern = r"\[ORIGINAL_ASSET:\s*.*?" + re.escape(filename) + r"\]"
-            content, count = re.subn(pattern, "", content)
-            removed_count += count
-            
-        # Robust fallback: identify ANY asset tags whose files no longer exist (critical for crash resumes)
+
         def _check_asset(match):
             nonlocal removed_count
             asset_path = match.group(1).strip()
-            full_path = OUTPUT_DIR / "assets" / asset_path
-            if not full_path.exists():
+            if (
+                os.path.basename(asset_path) in discarded_set
+                or not (OUTPUT_DIR / "assets" / asset_path).exists()
+            ):
                 removed_count += 1
                 return ""  # Strip tag if file is gone
             return match.group(0)
-            
-        content = re.sub(r"\[ORIGINAL_ASSET:\s*([^\]]+)\]", _check_asset, content)
+
+        content = _ASSET_TAG_RE.sub(_check_asset, content)
 
         manuscript_path.write_text(content, encoding="utf-8")
         print(f"🧹 Cleaned manuscript. Removed {removed_count} dead/transcribed tags.")
@@ -0,0 +1,9 @@
+import os
+import sys
+from pathlib import Path
+
+# Tests import the pipeline as ``src.*``, the same way main.py does
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# litellm otherwise fetches its model cost map over the network on import
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
@@ -0,0 +1,90 @@
+from src.post_processor import deduplicate_paragraphs
+from src.renderer_typst import render_page_typst
+
+SOLUTION = (
+    "The normal stress is the applied axial load divided by the "
+    "cross-sectional area of the member, taken perpendicular to the load."
+)
+
+
+def _example(title: str, statement: str) -> dict:
+    return {
+        "type": "example_problem",
+        "title": title,
+        "problem_statement": statement,
+        "solution_steps": [[{"type": "paragraph", "text": SOLUTION}]],
+    }
+
+
+def test_repeated_example_solution_keeps_typst_balanced():
+    chapter = {
+        "title": "Stress",
+        "sections": [
+            _example("Example 1", "A 10 kN load acts on a 2 sq cm bar."),
+            {"type": "paragraph", "text": "Stress is a measure of internal force."},
+            _example("Example 2", "A 20 kN load acts on a 5 sq cm bar."),
+        ],
+    }
+    body = render_page_typst(chapter)
+    assert len(SOLUTION) >= 100
+
+    out = deduplicate_paragraphs(body)
+
+    assert out.count("[") == out.count("]")
+    assert out.count("#solution[") == 2
+    assert out.count(SOLUTION) == 2
+
+
+def test_repeated_prose_paragraph_is_dropped_globally():
+    prose = (
+        "Shear stress acts parallel to the surface of a material element and "
+        "arises whenever adjacent layers tend to slide past each other."
+    )
+    body = "\n\n".join([prose, "= Heading", "A short unrelated line.", prose])
+
+    out = deduplicate_paragraphs(body)
+
+    assert out.count(prose) == 1
+    assert "= Heading" in out
+
+
+def test_markup_block_is_not_dropped_globally():
+    block = "#figure[" + "x" * 120 + "]"
+    body = "\n\n".join([block, "Some prose in between.", block])
+
+    assert deduplicate_paragraphs(body).count(block) == 2
+
+
+MOMENT_OF_INERTIA = (
+    "The moment of inertia of a body about an axis measures how the mass of the "
+    "body is distributed about that axis. The moment of inertia of a body about "
+    "an axis through its centroid is the smallest moment of inertia of the body "
+    "about any parallel axis. By the parallel axis theorem, the moment of inertia "
+    "of the body about any other axis equals the centroidal moment of inertia "
+    "plus the mass of the body times the square of the distance between the axes."
+)
+
+CIRCUITS = (
+    "In a series circuit the same current flows through every resistor, and the "
+    "total resistance of the circuit is the sum of the resistances. In a parallel "
+    "circuit the same voltage appears across every resistor, and the reciprocal "
+    "of the total resistance of the circuit is the sum of the reciprocals of the "
+    "resistances. The total resistance of a parallel circuit is therefore always "
+    "smaller than the smallest resistance in the circuit."
+)
+
+
+def test_dense_technical_paragraphs_survive():
+    for paragraph in (MOMENT_OF_INERTIA, CIRCUITS):
+        assert len(paragraph.split()) >= 50
+        out = deduplicate_paragraphs("Intro\n\n" + paragraph)
+        assert out == "Intro\n\n" + paragraph
+
+
+def test_looping_sentence_is_collapsed_to_one_copy():
+    loop = "The stress in the bar is equal to the load divided by the area."
+    body = "Intro\n\n" + CIRCUITS + " " + " ".join([loop] * 4) + " Next we consider strain."
+
+    out = deduplicate_paragraphs(body)
+
+    assert out == "Intro\n\n" + CIRCUITS + " " + loop + " Next we consider strain."
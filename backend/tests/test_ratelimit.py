@@ -0,0 +1,49 @@
+import asyncio
+import time
+
+from src import ratelimit
+from src.ratelimit import TokenBucket, backoff_delay, get_bucket
+
+
+def test_bucket_throttles_past_capacity():
+    bucket = TokenBucket(rate=20.0, capacity=2.0)
+
+    async def take(n):
+        for _ in range(n):
+            await bucket.acquire()
+
+    start = time.monotonic()
+    asyncio.run(take(4))
+    # Two tokens are free; the other two refill at 20/s
+    assert time.monotonic() - start >= 0.09
+
+
+def test_cooldown_holds_every_caller():
+    bucket = TokenBucket(rate=1000.0, capacity=10.0)
+    bucket.cooldown(0.1)
+
+    start = time.monotonic()
+    asyncio.run(bucket.acquire())
+    assert time.monotonic() - start >= 0.09
+
+
+def test_bucket_survives_separate_event_loops():
+    bucket = TokenBucket(rate=1000.0, capacity=10.0)
+    asyncio.run(bucket.acquire())
+    asyncio.run(bucket.acquire())  # Lock is rebound to the new loop
+
+
+def test_buckets_are_shared_per_provider(monkeypatch):
+    monkeypatch.setattr(ratelimit, "_BUCKETS", {})
+    monkeypatch.setenv("GEMINI_RPM", "120")
+
+    bucket = get_bucket("gemini/gemini-2.0-flash")
+    assert bucket is get_bucket("gemini/gemini-2.5-flash")
+    assert bucket is not get_bucket("groq/llama3-8b-8192")
+    assert bucket.rate == 2.0
+
+
+def test_backoff_delay_grows_and_is_capped():
+    assert 2.0 <= backoff_delay(0) <= 3.0
+    assert 8.0 <= backoff_delay(2) <= 12.0
+    assert backoff_delay(10) == 30.0
@@ -0,0 +1,58 @@
+from src import renderer_typst
+from src.renderer_typst import _render_cache_key, render_pages_typst
+
+CHAPTER = {
+    "title": "Stress",
+    "sections": [{"type": "paragraph", "text": "Stress is force per unit area."}],
+}
+
+
+def test_render_cache_reuses_rendered_chapter(tmp_path):
+    first = render_pages_typst([CHAPTER], workers=1, cache_dir=tmp_path)
+    cached = tmp_path / f"{_render_cache_key(CHAPTER)}.typ"
+    assert cached.read_text(encoding="utf-8") == first[0][0]
+
+    cached.write_text("SENTINEL", encoding="utf-8")
+    assert render_pages_typst([CHAPTER], workers=1, cache_dir=tmp_path) == [("SENTINEL", None)]
+
+
+def test_render_cache_key_changes_with_renderer_source(monkeypatch):
+    before = _render_cache_key(CHAPTER)
+    monkeypatch.setattr(renderer_typst, "_RENDERER_HASH", b"edited renderer")
+    assert _render_cache_key(CHAPTER) != before
+
+
+def test_math_never_spans_an_image():
+    text = "The cost rose from $5 to ![Price chart](assets/chart.png) roughly $10."
+    out = renderer_typst.render_paragraph_with_images(text)
+
+    assert '#figure(image("assets/chart.png", width: 90%), caption: [Price chart])' in out
+    assert "![" not in out
+    assert out.count("\\$") == 2  # Both unpaired dollars stay literal
+
+
+def test_math_between_images_is_still_rendered():
+    text = "Area $A = b h$ is shown ![Fig](a.png) and $x$ here."
+    out = renderer_typst.render_paragraph_with_images(text)
+
+    assert out.startswith("Area $A = b h$ is shown")
+    assert "and $x$ here." in out
+    assert '#figure(image("a.png", width: 90%), caption: [Fig])' in out
+
+
+def test_image_in_list_item_stays_inside_the_item():
+    section = {"type": "list", "items": ["See ![Fig](a.png) here", "b"]}
+    out = renderer_typst.render_section_typst(section)
+
+    assert out == (
+        "- See \n"
+        "\n"
+        '  #figure(image("a.png", width: 90%), caption: [Fig])\n'
+        "   here\n"
+        "- b\n"
+    )
+    # Every line after a blank one is indented under the "- " marker
+    lines = out.splitlines()
+    for prev, line in zip(lines, lines[1:]):
+        if not prev and line:
+            assert line.startswith("  ")
@@ -0,0 +1,65 @@
+from types import SimpleNamespace
+
+import pytest
+
+from src import llm_cache, resolver
+
+
+@pytest.fixture
+def fake_art(monkeypatch, tmp_path):
+    """Describe/regenerate stubs; record every prompt the enhancer sends."""
+    calls = {"describe": 0, "subjects": []}
+
+    def generate_content(**kwargs):
+        calls["describe"] += 1
+        return SimpleNamespace(text="A lever with fulcrum F")
+
+    def generate_textbook_diagram(subject, theme_config, save_path):
+        calls["subjects"].append(subject)
+        save_path.write_bytes(b"enhanced")
+        return True
+
+    client = SimpleNamespace(models=SimpleNamespace(generate_content=generate_content))
+    monkeypatch.setattr(resolver, "HAS_GENAI", True)
+    monkeypatch.setattr(resolver, "AI_ASSETS_DIR", tmp_path / "assets" / "ai_generated")
+    monkeypatch.setattr(resolver, "_get_genai_client", lambda api_key: client)
+    monkeypatch.setattr(resolver, "generate_textbook_diagram", generate_textbook_diagram)
+    return calls
+
+
+def test_prompt_version_follows_prompt_text():
+    assert resolver._PROMPT_VERSION == llm_cache.prompt_hash(
+        resolver.DESCRIBE_PROMPT,
+        resolver.REGENERATE_PROMPT,
+        resolver.DEFAULT_ILLUSTRATION_STYLE,
+        resolver.DIAGRAM_PROMPT,
+    )
+
+
+def test_edited_prompt_invalidates_enhanced_image(fake_art, monkeypatch, tmp_path):
+    source = tmp_path / "fig.png"
+    source.write_bytes(b"\x89PNG original")
+
+    first = resolver.enhance_image_with_gemini(source)
+    assert resolver.enhance_image_with_gemini(source) == first
+    assert fake_art["describe"] == 1
+    assert fake_art["subjects"] == [
+        resolver.REGENERATE_PROMPT.format(description="A lever with fulcrum F")
+    ]
+
+    edited = resolver.DESCRIBE_PROMPT + " List every label verbatim."
+    monkeypatch.setattr(resolver, "DESCRIBE_PROMPT", edited)
+    monkeypatch.setattr(
+        resolver,
+        "_PROMPT_VERSION",
+        llm_cache.prompt_hash(
+            edited,
+            resolver.REGENERATE_PROMPT,
+            resolver.DEFAULT_ILLUSTRATION_STYLE,
+            resolver.DIAGRAM_PROMPT,
+        ),
+    )
+    second = resolver.enhance_image_with_gemini(source)
+
+    assert second != first
+    assert fake_art["describe"] == 2
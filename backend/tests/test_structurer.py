@@ -0,0 +1,77 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from src import llm_cache, structurer
+
+
+class _Bucket:
+    async def acquire(self):
+        return None
+
+
+@pytest.fixture
+def fake_llm(monkeypatch, tmp_path):
+    """Stream back a structure echoing the chunk; count the calls."""
+    calls = []
+
+    async def acompletion(**kwargs):
+        chunk = kwargs["messages"][1]["content"]
+        calls.append(chunk)
+        body = json.dumps(
+            {"type": "chapter", "sections": [{"type": "paragraph", "text": chunk}]}
+        )
+
+        async def stream():
+            yield SimpleNamespace(
+                choices=[SimpleNamespace(delta=SimpleNamespace(content=body))]
+            )
+
+        return stream()
+
+    monkeypatch.setenv("LLM_PROVIDER", "gemini")
+    monkeypatch.setenv("DEFAULT_MODEL", "gemini/test-model")
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    monkeypatch.setattr(llm_cache, "CACHE_DIR", tmp_path)
+    monkeypatch.setattr(llm_cache, "ENABLED", True)
+    monkeypatch.setattr(structurer, "get_bucket", lambda model: _Bucket())
+    monkeypatch.setattr(structurer.litellm, "acompletion", acompletion)
+    return calls
+
+
+def _text(result: dict) -> str:
+    return result["sections"][0]["text"]
+
+
+def test_identical_chunk_is_served_from_cache(fake_llm):
+    chunk = "Example 3: A 10 kN load acts on a 2 sq cm bar."
+    first = asyncio.run(structurer.structurer_node(chunk))
+    second = asyncio.run(structurer.structurer_node(chunk))
+
+    assert first == second
+    assert len(fake_llm) == 1
+
+
+def test_chunk_differing_only_in_numbers_calls_the_llm(fake_llm):
+    asyncio.run(
+        structurer.structurer_node("Example 3: A 10 kN load acts on a 2 sq cm bar.")
+    )
+    result = asyncio.run(
+        structurer.structurer_node("Example 4: A 20 kN load acts on a 5 sq cm bar.")
+    )
+
+    assert len(fake_llm) == 2
+    assert _text(result) == "Example 4: A 20 kN load acts on a 5 sq cm bar."
+
+
+def test_prompt_edit_invalidates_cached_structures(fake_llm, monkeypatch):
+    chunk = "Stress is force per unit area."
+    asyncio.run(structurer.structurer_node(chunk))
+
+    edited = structurer.SYSTEM_PROMPT + "\n9. A new rule."
+    monkeypatch.setattr(structurer, "PROMPT_VERSION", llm_cache.prompt_hash(edited))
+    asyncio.run(structurer.structurer_node(chunk))
+
+    assert len(fake_llm) == 2
@@ -0,0 +1,118 @@
+import io
+import json
+from types import SimpleNamespace
+
+import pytest
+from PIL import Image
+
+from src import llm_cache, triage
+
+
+class _Bucket:
+    async def acquire(self):
+        return None
+
+
+class _FakeModels:
+    """Collage requests get ``collage_decision`` for every tile; single images KEEP."""
+
+    def __init__(self, collage_decision: str):
+        self.collage_decision = collage_decision
+        self.prompts = []
+
+    async def generate_content(self, model, contents):
+        prompt = contents[0].parts[1].text
+        self.prompts.append(prompt)
+        if prompt != triage.TRIAGE_PROMPT:
+            answer = {
+                label: {"decision": self.collage_decision, "reason": "collage"}
+                for label in triage._TILE_LABELS
+            }
+        else:
+            answer = {"decision": "KEEP", "reason": "single"}
+        return SimpleNamespace(text=json.dumps(answer))
+
+
+@pytest.fixture
+def triage_env(monkeypatch, tmp_path):
+    out = tmp_path / "output"
+    monkeypatch.setattr(triage, "OUTPUT_DIR", out)
+    monkeypatch.setattr(triage, "TRANSCRIBED_MATH_PATH", out / "transcribed_math.json")
+    monkeypatch.setattr(
+        triage, "TRANSCRIBED_JOURNAL_PATH", out / "transcribed_math.jsonl"
+    )
+    monkeypatch.setattr(triage, "get_bucket", lambda model: _Bucket())
+    monkeypatch.setattr(llm_cache, "CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(llm_cache, "ENABLED", True)
+    images = tmp_path / "images"
+    images.mkdir()
+    return images
+
+
+def _save_images(folder, count):
+    for n in range(count):
+        Image.new("RGB", (120 + n, 100), (n * 20, 0, 0)).save(folder / f"im{n}.png")
+
+
+def test_collage_discard_is_confirmed_per_image(triage_env, monkeypatch):
+    models = _FakeModels("DISCARD")
+    client = SimpleNamespace(aio=SimpleNamespace(models=models))
+    monkeypatch.setattr(triage, "_get_vision_client", lambda: client)
+    monkeypatch.setattr(triage, "TRIAGE_COLLAGE", True)
+    _save_images(triage_env, 4)
+
+    discarded = triage.process_images(str(triage_env))
+
+    # The single-image check overrules the collage: nothing is deleted
+    assert discarded == []
+    assert len(list(triage_env.iterdir())) == 4
+    assert len(models.prompts) == 1 + 4  # one collage, then each image alone
+
+
+def test_collage_keep_needs_no_single_image_calls(triage_env, monkeypatch):
+    models = _FakeModels("KEEP")
+    client = SimpleNamespace(aio=SimpleNamespace(models=models))
+    monkeypatch.setattr(triage, "_get_vision_client", lambda: client)
+    monkeypatch.setattr(triage, "TRIAGE_COLLAGE", True)
+    _save_images(triage_env, 4)
+
+    assert triage.process_images(str(triage_env)) == []
+    assert len(models.prompts) == 1
+
+
+def test_journal_is_replayed_and_folded_into_json(triage_env, monkeypatch):
+    monkeypatch.setattr(triage, "_get_vision_client", lambda: None)
+    triage.OUTPUT_DIR.mkdir(parents=True)
+    triage.TRANSCRIBED_JOURNAL_PATH.write_bytes(
+        b'{"a.png": "\\\\[x\\\\]"}\n{"b.png": "y"}\n{"c.png": '  # torn last line
+    )
+
+    triage.process_images(str(triage_env))
+
+    assert json.loads(triage.TRANSCRIBED_MATH_PATH.read_text(encoding="utf-8")) == {
+        "a.png": "\\[x\\]",
+        "b.png": "y",
+    }
+    assert not triage.TRANSCRIBED_JOURNAL_PATH.exists()
+
+
+@pytest.mark.parametrize(
+    "fmt, options",
+    [
+        ("PNG", {}),
+        ("JPEG", {}),
+        ("JPEG", {"progressive": True}),
+        ("JPEG", {"icc_profile": b"x" * 3000}),
+    ],
+)
+def test_fast_dims_reads_headers(fmt, options):
+    buf = io.BytesIO()
+    Image.new("RGB", (321, 123)).save(buf, fmt, **options)
+    assert triage._fast_dims(buf.getvalue()) == (321, 123)
+
+
+def test_fast_dims_defers_unknown_formats():
+    buf = io.BytesIO()
+    Image.new("RGB", (5, 6)).save(buf, "GIF")
+    assert triage._fast_dims(buf.getvalue()) is None
+    assert triage._fast_dims(b"junk") is None